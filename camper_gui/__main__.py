@@ -1,13 +1,23 @@
+import time
+
+START_TIME = time.perf_counter()
+
 import customtkinter
 import platform
-import requests
-from concurrent import futures
+import sqlite3
 
+from api_client import ApiClient, ApiException, ApiOffline
+from fetch_engine import FetchEngine, PRIORITY_LOW
+from message_log import MessageLog
 from camper_interface_frame import CamperInterfaceFrame
+from diagnostics_frame import DiagnosticsFrame
 from temperature_frame import TemperatureFrame
-from graph_frame import GraphFrame
 from status_frames import StatusBarFrame, StatusMessagesFrame
 from power_frame import PowerFrame
+from state_poller import StatePoller
+from state_store import StateStore
+from state_stream import StateStream
+from ui_queue import UiQueue
 from config import settings
 
 
@@ -33,42 +43,73 @@ class App(customtkinter.CTk):
         self.tabview.add("Status")
         self.tabview.add("History")
         self.tabview.add("Messages")
+        self.tabview.add("Diagnostics")
 
-        self.statusbar_frame = StatusBarFrame(self)
+        self.ui_queue = UiQueue(self)
+        self.message_log, message_log_error = self._open_database(MessageLog)
+        self.statusbar_frame = StatusBarFrame(self, self.ui_queue, self.message_log)
 
-        try:
-            sensors_resp = requests.get(f"{settings.api_base}/sensors")
-            api_sensors = sensors_resp.json()
-        except (
-            requests.exceptions.Timeout,
-            requests.exceptions.ConnectionError,
-        ) as ex:
-            api_sensors = []
-            self.statusbar_frame.add_message(
-                f"Could not communicatie with API: {ex.__class__.__name__}",
-                details=str(ex),
-            )
+        self.api_client = ApiClient(on_change=self._api_state_changed)
+        self.state_store, state_store_error = self._open_database(StateStore)
 
-        self.executor = futures.ThreadPoolExecutor(max_workers=1)
+        for name, error in (
+            ("message log", message_log_error),
+            ("state store", state_store_error),
+        ):
+            if error is not None:
+                self.statusbar_frame.add_message(
+                    f"Could not open the {name}, it is kept in memory: "
+                    f"{error.__class__.__name__}",
+                    details=str(error),
+                )
+
+        # Start from the catalogue of the previous run, the API one is fetched
+        # in the background by catalogue_runner()
+        api_sensors = self.state_store.read_catalogue() or []
+        self.catalogue_synced = False
+        self.catalogue_future = None
+
+        self.executor = FetchEngine()
+        self.poller = StatePoller(
+            self,
+            self.statusbar_frame,
+            self.ui_queue,
+            self.api_client,
+            self.state_store,
+            api_sensors,
+            self.executor,
+        )
 
         self.camper_interface_frame = CamperInterfaceFrame(
-            self.tabview.tab("Status"), self.statusbar_frame, api_sensors, self.executor
+            self.tabview.tab("Status"),
+            self.statusbar_frame,
+            self.ui_queue,
+            self.api_client,
+            self.poller,
+            self.executor,
         )
         self.power_frame = PowerFrame(
-            self.tabview.tab("Status"), self.statusbar_frame, api_sensors, self.executor
+            self.tabview.tab("Status"), self.statusbar_frame, self.poller, self.executor
         )
         self.temperture_frame = TemperatureFrame(
-            self.tabview.tab("Status"), self.statusbar_frame, api_sensors, self.executor
+            self.tabview.tab("Status"), self.statusbar_frame, self.poller, self.executor
         )
-        self.graph_frame = GraphFrame(
-            self.tabview.tab("History"),
-            self.statusbar_frame,
-            api_sensors,
-            self.executor,
+        self.poller.start()
+        self.state_stream = StateStream(
+            self.statusbar_frame, self.api_client, self.poller
         )
+        self.state_stream.start()
+        self.api_sensors = api_sensors
+        # Built on first switch to the History tab, see _build_graph_frame()
+        self.graph_frame = None
         self.status_messages_frame = StatusMessagesFrame(
-            self.tabview.tab("Messages"), self.statusbar_frame, self.executor
+            self.tabview.tab("Messages"),
+            self.statusbar_frame,
+            self.ui_queue,
+            self.message_log,
+            self.executor,
         )
+        self.diagnostics_frame = DiagnosticsFrame(self.tabview.tab("Diagnostics"))
         self.tabview.grid(row=0, column=0, padx=5, pady=0, sticky="nsew")
 
         self.tabview.tab("Status").grid_columnconfigure((0, 1), weight=1)
@@ -77,6 +118,8 @@ class App(customtkinter.CTk):
         self.tabview.tab("History").grid_rowconfigure(1, weight=1)
         self.tabview.tab("Messages").grid_columnconfigure(0, weight=1)
         self.tabview.tab("Messages").grid_rowconfigure(1, weight=1)
+        self.tabview.tab("Diagnostics").grid_columnconfigure(0, weight=1)
+        self.tabview.tab("Diagnostics").grid_rowconfigure(1, weight=1)
 
         self.camper_interface_frame.grid(
             row=1, column=0, padx=10, pady=(10, 0), sticky="nsew", rowspan=2
@@ -85,28 +128,134 @@ class App(customtkinter.CTk):
         self.temperture_frame.grid(
             row=2, column=1, padx=10, pady=(10, 0), sticky="nsew"
         )
-        self.graph_frame.grid(
-            row=1, column=0, padx=(0, 10), pady=(10, 0), sticky="nsew"
-        )
         self.status_messages_frame.grid(
             row=1, column=0, padx=(0, 0), pady=(10, 0), sticky="nsew"
         )
+        self.diagnostics_frame.grid(
+            row=1, column=0, padx=(0, 0), pady=(10, 0), sticky="nsew"
+        )
         self.statusbar_frame.grid(
             row=3, column=0, padx=(0, 0), pady=(10, 0), sticky="nsew"
         )
+        self.ui_queue.start()
+        self.after_idle(self._report_startup)
+        self.compact_store_runner()
+        self.catalogue_runner()
+
+    def _open_database(self, database_class):
+        # A corrupt or read-only SD card must not keep the GUI from starting
+        try:
+            return database_class(), None
+        except (sqlite3.DatabaseError, OSError) as ex:
+            return database_class(":memory:"), ex
+
+    def catalogue_runner(self):
+        if self.catalogue_future is None or self.catalogue_future.done():
+            self.catalogue_future = self.executor.submit(
+                self.refresh_catalogue, key="catalogue"
+            )
+
+        # Retry quickly until the API has answered once
+        if self.catalogue_synced:
+            self.after(settings.catalogue_refresh_interval_ms, self.catalogue_runner)
+        else:
+            self.after(settings.poll_interval_ms, self.catalogue_runner)
+
+    def refresh_catalogue(self):
+        try:
+            api_sensors = self.api_client.get_sensors()
+        except ApiOffline:
+            return
+        except ApiException as ex:
+            self.statusbar_frame.add_message(
+                f"Could not communicatie with API: {ex.__class__.__name__}",
+                details=str(ex),
+            )
+            return
+
+        if api_sensors != self.api_sensors:
+            self.state_store.write_catalogue(api_sensors)
+
+        self.ui_queue.post(self.set_sensors, api_sensors, key="catalogue")
+
+    def set_sensors(self, api_sensors):
+        self.catalogue_synced = True
+        if api_sensors == self.api_sensors:
+            return
+
+        self.api_sensors = api_sensors
+        self.poller.set_sensors(api_sensors)
+        if self.graph_frame is not None:
+            self.graph_frame.set_sensors(api_sensors)
+
+        self.poller.submit_poll()
+
+    def _api_state_changed(self, offline_since):
+        # Called from worker threads by the API circuit breaker
+        if offline_since is None:
+            self.statusbar_frame.add_message("API back online", state="info")
+        else:
+            self.statusbar_frame.add_message(
+                f"API offline since {offline_since:%H:%M:%S}", state="warning"
+            )
+
+    def compact_store_runner(self):
+        self.executor.submit(
+            self.state_store.compact, key="compact_store", priority=PRIORITY_LOW
+        )
+        self.executor.submit(
+            self.message_log.rotate, key="rotate_log", priority=PRIORITY_LOW
+        )
+        self.after(settings.state_store_compact_interval_ms, self.compact_store_runner)
+
+    def _report_startup(self):
+        self.statusbar_frame.add_message(
+            f"Started in {time.perf_counter() - START_TIME:.2f} s", state="info"
+        )
+
+    def _build_graph_frame(self):
+        started = time.perf_counter()
+
+        # matplotlib and numpy are only needed here, keep them off the boot path
+        from graph_frame import GraphFrame
+
+        self.graph_frame = GraphFrame(
+            self.tabview.tab("History"),
+            self.statusbar_frame,
+            self.ui_queue,
+            self.api_client,
+            self.state_store,
+            self.api_sensors,
+            self.executor,
+        )
+        self.graph_frame.grid(
+            row=1, column=0, padx=(0, 10), pady=(10, 0), sticky="nsew"
+        )
+
+        self.statusbar_frame.add_message(
+            f"History loaded in {time.perf_counter() - started:.2f} s", state="info"
+        )
 
     def main_tab_changed(self):
         current_tab = self.tabview.get()
 
+        if current_tab != "History" and self.graph_frame is not None:
+            if settings.low_memory:
+                self.graph_frame.release()
+
         match current_tab:
             case "Status":
-                self.executor.submit(self.camper_interface_frame.update_states)
-                self.executor.submit(self.power_frame.update_states)
+                self.poller.submit_poll()
             case "History":
+                if self.graph_frame is None:
+                    self._build_graph_frame()
+
                 self.graph_frame.reset()
                 # self.executor.submit(self.graph_frame.update_plot)
             case "Messages":
-                self.executor.submit(self.status_messages_frame.update_messages)
+                self.status_messages_frame.update_messages()
+            case "Diagnostics":
+                self.diagnostics_frame.update_diagnostics()
             case _:
                 raise Exception(f"Unknown tab {current_tab}")
 
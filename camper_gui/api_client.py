@@ -0,0 +1,287 @@
+import codecs
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import settings
+from instrumentation import metrics
+
+
+class ApiException(Exception):
+    pass
+
+
+class ApiTimeout(ApiException):
+    pass
+
+
+class ApiConnectionError(ApiException):
+    pass
+
+
+class ApiResponseError(ApiException):
+    pass
+
+
+class ApiOffline(ApiException):
+    pass
+
+
+class ApiStreamUnsupported(ApiException):
+    pass
+
+
+def _stream_lines(resp):
+    # Lines of a streamed response as soon as they arrive. iter_lines() waits
+    # for 512 bytes, holding back small events on streams without chunked
+    # framing. Events are UTF-8 by spec, the content type names no charset.
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    while True:
+        chunk = resp.raw.read1(1024, decode_content=True)
+        if not chunk:
+            break
+
+        *lines, pending = (pending + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+
+
+class CircuitBreaker:
+    # Opens after `failures` consecutive requests without a response. While
+    # open requests fail right away, except for one probe at a time, spaced
+    # with exponential backoff and jitter. `on_change` is called with the
+    # datetime the API went offline, or None when it is back.
+    def __init__(self, failures=None, backoff=None, max_backoff=None, on_change=None):
+        self.failures = failures or settings.api_breaker_failures
+        self.backoff = backoff or settings.api_breaker_backoff
+        self.max_backoff = max_backoff or settings.api_breaker_max_backoff
+        self.on_change = on_change
+
+        self.lock = threading.Lock()
+        self.failure_count = 0
+        self.open_count = 0
+        self.offline_since = None
+        self.retry_at = 0
+        self.probing = False
+
+    def allow(self):
+        # Raises ApiOffline while open, with the time read under the lock as a
+        # probe may close the breaker any moment
+        with self.lock:
+            if self.offline_since is None:
+                return
+
+            if self.probing or time.monotonic() < self.retry_at:
+                raise ApiOffline(
+                    f"API offline since {self.offline_since:%Y-%m-%d %H:%M:%S}"
+                )
+
+            self.probing = True
+
+    def record_success(self):
+        with self.lock:
+            was_offline = self.offline_since is not None
+
+            self.failure_count = 0
+            self.open_count = 0
+            self.offline_since = None
+            self.probing = False
+
+        if was_offline and self.on_change is not None:
+            self.on_change(None)
+
+    def record_failure(self):
+        with self.lock:
+            self.failure_count += 1
+
+            if self.offline_since is None:
+                if self.failure_count < self.failures:
+                    return
+                self.offline_since = datetime.now()
+                opened = True
+            elif self.probing:
+                opened = False
+            else:
+                # Sent before the breaker opened
+                return
+
+            delay = min(self.backoff * 2**self.open_count, self.max_backoff)
+            self.open_count += 1
+            self.retry_at = time.monotonic() + delay / 2 + random.uniform(0, delay / 2)
+            self.probing = False
+            offline_since = self.offline_since
+
+        if opened and self.on_change is not None:
+            self.on_change(offline_since)
+
+    def cancel_probe(self):
+        # The probe ended without an outcome, the next request probes again
+        with self.lock:
+            self.probing = False
+
+
+class ApiClient:
+    def __init__(self, api_base=None, on_change=None):
+        self.api_base = api_base or settings.api_base
+        self.breaker = CircuitBreaker(on_change=on_change)
+
+        # Only idempotent requests are retried, actions are never sent twice.
+        retry = Retry(
+            total=settings.api_retries,
+            connect=settings.api_retries,
+            read=0,
+            backoff_factor=0.2,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=("GET",),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=settings.task_workers + settings.fetch_workers,
+            max_retries=retry,
+        )
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _send(self, method, path, timeout, **kwargs):
+        self.breaker.allow()
+
+        endpoint = re.sub(r"/\d+", "/{id}", path)
+        try:
+            with metrics.timer(f"api {method} {endpoint}"):
+                resp = self.session.request(
+                    method,
+                    f"{self.api_base}{path}",
+                    timeout=(settings.api_connect_timeout, timeout),
+                    **kwargs,
+                )
+        except requests.exceptions.RequestException:
+            # Timeouts, connection errors and bodies cut off mid-transfer
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.cancel_probe()
+            raise
+
+        # Any response, errors included, shows the API is reachable
+        self.breaker.record_success()
+
+        return resp
+
+    def _request(self, method, path, timeout, decode=None, **kwargs):
+        try:
+            resp = self._send(method, path, timeout, **kwargs)
+            resp.raise_for_status()
+
+            if decode is not None:
+                return decode(resp.content)
+
+            return resp.json()
+        except requests.exceptions.Timeout as ex:
+            raise ApiTimeout(str(ex)) from ex
+        except requests.exceptions.ConnectionError as ex:
+            raise ApiConnectionError(str(ex)) from ex
+        except (requests.exceptions.RequestException, ValueError, KeyError) as ex:
+            raise ApiResponseError(str(ex)) from ex
+
+    def get_sensors(self):
+        return self._request("GET", "/sensors", settings.api_timeout_sensors)
+
+    def get_sensor_states(self, sensor_id):
+        return self._request(
+            "GET", f"/sensors/{sensor_id}/states/", settings.api_timeout_states
+        )
+
+    def get_entity_states(self, entity_id, limit=10000, since=None, decode=None):
+        params = {"limit": limit}
+        if since is not None:
+            params["since"] = since
+
+        return self._request(
+            "GET",
+            f"/entities/{entity_id}/states",
+            settings.api_timeout_history,
+            decode=decode,
+            params=params,
+        )
+
+    def get_entity_state(self, entity_id):
+        # Latest state of a single entity, for confirming actions
+        states = self._request(
+            "GET",
+            f"/entities/{entity_id}/states",
+            settings.api_timeout_states,
+            params={"limit": 1},
+        )
+        if not states:
+            return None
+
+        return max(states, key=lambda s: s["created"])["state"]
+
+    def post_action(self, entity_id, state):
+        return self._request(
+            "POST",
+            f"/action/{entity_id}",
+            settings.api_timeout_action,
+            json={"state": state},
+        )
+
+    def stream_states(self):
+        # Server-sent events with a JSON list of states in each event. Yields
+        # an empty list once connected, then the states of every event.
+        try:
+            resp = self._send(
+                "GET",
+                settings.api_stream_path,
+                settings.api_timeout_stream,
+                stream=True,
+                headers={"Accept": "text/event-stream"},
+            )
+
+            with resp:
+                if resp.status_code in (404, 405, 501):
+                    raise ApiStreamUnsupported(
+                        f"{resp.status_code} for {settings.api_stream_path}"
+                    )
+                resp.raise_for_status()
+
+                content_type = resp.headers.get("Content-Type", "")
+                if not content_type.startswith("text/event-stream"):
+                    raise ApiStreamUnsupported(
+                        f"{content_type or 'no content type'} for "
+                        f"{settings.api_stream_path}"
+                    )
+
+                yield []
+
+                data = []
+                for line in _stream_lines(resp):
+                    if line.startswith("data:"):
+                        data.append(line[5:].strip())
+                    elif not line and data:
+                        yield json.loads("\n".join(data))
+                        data = []
+        except (requests.exceptions.Timeout, urllib3.exceptions.TimeoutError) as ex:
+            raise ApiTimeout(str(ex)) from ex
+        except (
+            requests.exceptions.ConnectionError,
+            urllib3.exceptions.HTTPError,
+        ) as ex:
+            # urllib3 errors come from reading the raw stream
+            raise ApiConnectionError(str(ex)) from ex
+        except (requests.exceptions.RequestException, ValueError, KeyError) as ex:
+            raise ApiResponseError(str(ex)) from ex
+
+    def close(self):
+        self.session.close()
@@ -1,19 +1,20 @@
-import requests
+import time
 import tkinter as tk
 
+from api_client import ApiException, ApiTimeout
 from config import settings
+from fetch_engine import PRIORITY_HIGH
 from frame_base import FrameBase
 
 
-class ApiException(Exception):
-    pass
-
-
 class CamperInterfaceFrame(FrameBase):
-    def __init__(self, master, statusbar, api_sensors, executor):
+    def __init__(self, master, statusbar, ui_queue, api_client, poller, executor):
         super().__init__(master)
         self.master = master
         self.statusbar = statusbar
+        self.ui_queue = ui_queue
+        self.api_client = api_client
+        self.poller = poller
         self.executor = executor
 
         self.grid_columnconfigure((0, 1), weight=1)
@@ -48,15 +49,6 @@ class CamperInterfaceFrame(FrameBase):
             self.household_voltage_entry,
         ) = self._add_entry("Household [V]", 8, 1)
 
-        self.sensor_id = None
-        for sensor in api_sensors:
-            if sensor["name"] == "camper":
-                self.sensor_id = sensor["id"]
-                self.entity_id_by_name = {
-                    e["name"]: e["id"] for e in sensor["entities"]
-                }
-                break
-
         self.entity_states = {
             "household_voltage": None,
             "starter_voltage": None,
@@ -67,166 +59,177 @@ class CamperInterfaceFrame(FrameBase):
             "pump_state": None,
         }
 
-        self.update_states_runner()
+        # Target state per entity with an action in flight
+        self.pending_actions = {}
+
+        self.poller.subscribe(self.set_states, "camper", self.entity_states.keys())
+
+    def _toggle(self, entity_name):
+        # Taps while an action for the entity is in flight are ignored
+        if entity_name in self.pending_actions:
+            return
+
+        target = "ON" if self.entity_states[entity_name] == "OFF" else "OFF"
+        self.pending_actions[entity_name] = target
+        self.update_camper_gui()
 
-    def _api_action(self, entity_name, state):
+        future = self.executor.submit(
+            self._api_action, entity_name, target, priority=PRIORITY_HIGH
+        )
+        if future.cancelled():
+            self._finish_action(entity_name, None)
+
+    def _api_action(self, entity_name, target):
+        # Runs on a worker, the target is shown as pending meanwhile. Switching
+        # to a target state is idempotent, so timed out requests are retried,
+        # but only after checking the camper did not switch already.
+        entity_id = None
+        state = None
         try:
-            if entity_name not in self.entity_id_by_name:
+            entity_id = self.poller.get_entity_id("camper", entity_name)
+            if entity_id is None:
                 raise ApiException(f"No entity_id for `{entity_name}`")
 
-            data_dict = {"state": state}
-            states_resp = requests.post(
-                f"{settings.api_base}/action/{self.entity_id_by_name[entity_name]}",
-                json=data_dict,
-            )
-
-            self.entity_states[entity_name] = states_resp.json()["state"]
-        except (
-            requests.exceptions.Timeout,
-            requests.exceptions.ConnectionError,
-            ApiException,
-        ) as ex:
-            self.entity_states["household_state"] = None
+            for attempt in range(settings.action_retries + 1):
+                try:
+                    state = self.api_client.post_action(entity_id, target)["state"]
+                    break
+                except ApiTimeout:
+                    if attempt == settings.action_retries:
+                        raise
+
+                    state = self._get_state(entity_id)
+                    if state == target:
+                        break
+                    time.sleep(settings.action_retry_delay_ms / 1000)
+
+            # Confirm with targeted polls of the entity, the state it settles
+            # on is shown, which rolls back a switch that did not happen.
+            for i in range(settings.action_confirm_polls):
+                if i:
+                    time.sleep(settings.action_confirm_interval_ms / 1000)
+
+                polled = self._get_state(entity_id)
+                if polled is not None:
+                    state = polled
+                if polled == target:
+                    break
+
+            if state != target:
+                self.statusbar.add_message(
+                    f"Switching {entity_name} to {target} was not confirmed",
+                    state="warning",
+                )
+        except ApiException as ex:
+            if state is None:
+                state = self._get_state(entity_id) if entity_id else None
 
             self.statusbar.add_message(
-                f"Could not retrieve household state from API: {ex.__class__.__name__}",
+                f"Could not switch {entity_name} to {target}: {ex.__class__.__name__}",
                 details=str(ex),
             )
         except Exception as ex:
-            self.entity_states["household_state"] = None
-
             self.statusbar.add_message(
                 f"General exception: {ex.__class__.__name__}",
                 details=str(ex),
             )
-        self.update_camper_gui()
-
-    def household_callback(self):
-        self.household_button.configure(state=tk.DISABLED)
-        self.pump_button.configure(state=tk.DISABLED)
-
-        if self.entity_states["household_state"] == "OFF":
-            self.executor.submit(self._api_action, "household_state", "ON")
-        else:
-            self.executor.submit(self._api_action, "household_state", "OFF")
-
-    def pump_callback(self):
-        self.household_button.configure(state=tk.DISABLED)
-        self.pump_button.configure(state=tk.DISABLED)
 
-        if self.entity_states["pump_state"] == "OFF":
-            self.executor.submit(self._api_action, "pump_state", "ON")
-        else:
-            self.executor.submit(self._api_action, "pump_state", "OFF")
+        self.ui_queue.post(self._finish_action, entity_name, state)
+        # Follow up the action with fast polls to pick up its effects
+        self.ui_queue.post(self.poller.boost, "camper", key=("boost", "camper"))
 
-    def update_states_runner(self):
-        current_tab = self.master.master.get()
+    def _get_state(self, entity_id):
+        try:
+            return self.api_client.get_entity_state(entity_id)
+        except ApiException:
+            return None
 
-        if current_tab == "Status":
-            self.executor.submit(self.update_states)
-        else:
-            for entity_name in self.entity_states.keys():
-                self.entity_states[entity_name] = None
+    def _finish_action(self, entity_name, state):
+        # Without a confirmed state the last polled one is shown again
+        self.pending_actions.pop(entity_name, None)
 
+        if state is None:
             self.update_camper_gui()
+        else:
+            self.set_states({entity_name: state})
 
-        self.after(5000, self.update_states_runner)
+    def household_callback(self):
+        self._toggle("household_state")
 
-    def update_states(self):
-        try:
-            if self.sensor_id is None:
-                raise ApiException("sensor_id not set")
+    def pump_callback(self):
+        self._toggle("pump_state")
 
-            states_resp = requests.get(
-                f"{settings.api_base}/sensors/{self.sensor_id}/states/", timeout=3
-            )
-            state_by_id = {s["entity_id"]: s["state"] for s in states_resp.json()}
-
-            for entity_name in self.entity_states.keys():
-                entity_id = self.entity_id_by_name[entity_name]
-                if entity_id in state_by_id.keys():
-                    self.entity_states[entity_name] = state_by_id[entity_id]
-        except (
-            requests.exceptions.Timeout,
-            requests.exceptions.ConnectionError,
-            ApiException,
-        ) as ex:
-            for entity_name in self.entity_states.keys():
-                self.entity_states[entity_name] = None
+    def set_states(self, states):
+        self.entity_states.update(states)
+        self.update_camper_gui()
 
-            self.statusbar.add_message(
-                f"Could not retrieve status from API: {ex.__class__.__name__}",
-                details=str(ex),
+    def _update_toggle(self, button, label, entity_name):
+        target = self.pending_actions.get(entity_name)
+        if target is not None:
+            self._configure(
+                button,
+                fg_color="orange",
+                text=f"{label} [{target} PENDING]",
+                state=tk.DISABLED,
             )
+            return
 
-        self.update_camper_gui()
-
-    def update_camper_gui(self):
-        match self.entity_states["household_state"]:
-            case "OFF":
-                self.household_button.configure(
-                    fg_color="darkred", text="Household [OFF]"
-                )
+        match self.entity_states[entity_name]:
             case "ON":
-                self.household_button.configure(fg_color="green", text="Household [ON]")
+                self._configure(button, fg_color="green", text=f"{label} [ON]")
+            case "OFF":
+                self._configure(button, fg_color="darkred", text=f"{label} [OFF]")
             case "PENDING":
-                self.household_button.configure(
-                    fg_color="orange", text="Household [PENDING]"
-                )
+                self._configure(button, fg_color="orange", text=f"{label} [PENDING]")
             case _:
-                self.household_button.configure(
-                    fg_color="gray", text="Household [Unknown]"
-                )
+                self._configure(button, fg_color="gray", text=f"{label} [Unknown]")
 
-        match self.entity_states["pump_state"]:
-            case "ON":
-                self.pump_button.configure(fg_color="green", text="Pump [ON]")
-            case "OFF":
-                self.pump_button.configure(fg_color="darkred", text="Pump [OFF]")
-            case _:
-                self.pump_button.configure(fg_color="gray", text="Pump [Unknown]")
+        self._configure(button, state=tk.NORMAL)
 
-        self.household_button.configure(state=tk.NORMAL)
-        self.pump_button.configure(state=tk.NORMAL)
+    def update_camper_gui(self):
+        self._update_toggle(self.household_button, "Household", "household_state")
+        self._update_toggle(self.pump_button, "Pump", "pump_state")
 
         water_progress = 0
         if self.entity_states["water_state"]:
-            water_progress = int(self.entity_states["water_state"]) / 100
-        self.water_progress.set(water_progress)
+            water_progress = float(self.entity_states["water_state"]) / 100
+        self._set_value(self.water_progress, water_progress)
 
         waste_progress = 0
         if self.entity_states["waste_state"]:
-            waste_progress = int(self.entity_states["waste_state"]) / 100
-        self.waste_progress.set(waste_progress)
+            waste_progress = float(self.entity_states["waste_state"]) / 100
+        self._set_value(self.waste_progress, waste_progress)
 
         if self.entity_states["mains_voltage"] is not None:
-            if int(self.entity_states["mains_voltage"]) > 7000:
-                self.mains_button.configure(fg_color="green", text="Mains [CONNECTED]")
+            if float(self.entity_states["mains_voltage"]) > 7000:
+                self._configure(
+                    self.mains_button, fg_color="green", text="Mains [CONNECTED]"
+                )
             else:
-                self.mains_button.configure(
-                    fg_color="darkred", text="Mains [NOT CONNECTED]"
+                self._configure(
+                    self.mains_button, fg_color="darkred", text="Mains [NOT CONNECTED]"
                 )
         else:
-            self.mains_button.configure(fg_color="gray", text="Mains [Unknown]")
+            self._configure(self.mains_button, fg_color="gray", text="Mains [Unknown]")
 
         if self.entity_states["household_voltage"]:
-            household_voltage = int(self.entity_states["household_voltage"]) / 1000
-            self.household_voltage.set(household_voltage)
+            household_voltage = float(self.entity_states["household_voltage"]) / 1000
+            self._set_value(self.household_voltage, household_voltage)
 
             if household_voltage > 12:
-                self.household_voltage_entry.configure(fg_color="green")
+                self._configure(self.household_voltage_entry, fg_color="green")
             else:
-                self.household_voltage_entry.configure(fg_color="red")
+                self._configure(self.household_voltage_entry, fg_color="red")
         else:
-            self.household_voltage_entry.configure(fg_color="grey")
+            self._configure(self.household_voltage_entry, fg_color="grey")
 
         if self.entity_states["starter_voltage"]:
-            starter_voltage = int(self.entity_states["starter_voltage"]) / 1000
-            self.starter_voltage.set(starter_voltage)
+            starter_voltage = float(self.entity_states["starter_voltage"]) / 1000
+            self._set_value(self.starter_voltage, starter_voltage)
 
             if starter_voltage > 12:
-                self.starter_voltage_entry.configure(fg_color="green")
+                self._configure(self.starter_voltage_entry, fg_color="green")
             else:
-                self.starter_voltage_entry.configure(fg_color="red")
+                self._configure(self.starter_voltage_entry, fg_color="red")
         else:
-            self.starter_voltage_entry.configure(fg_color="grey")
+            self._configure(self.starter_voltage_entry, fg_color="grey")
@@ -4,6 +4,63 @@ import platform
 
 class Settings(BaseSettings):
     api_base: str = "http://localhost:8000"
+    poll_interval_ms: int = 5000
+    # Per sensor poll interval, poll_interval_ms for sensors not listed
+    poll_intervals_ms: dict[str, int] = {
+        "SmartSolar": 2000,
+        "SmartShunt": 3000,
+        "camper": 5000,
+        "outside": 30000,
+        "inside": 30000,
+    }
+    poll_stable_factor: float = 1.5
+    poll_stable_max_factor: float = 4
+    poll_boost_interval_ms: int = 1000
+    poll_boost_duration_ms: int = 10000
+    # Poll interval while state changes are streamed
+    poll_stream_interval_ms: int = 60000
+    catalogue_refresh_interval_ms: int = 600000
+    task_workers: int = 3
+    # Queued tasks beyond this drop the oldest low priority one
+    task_queue_limit: int = 32
+    # At least the number of sensors polled on the Status tab (5), so a full
+    # poll cycle takes as long as its slowest request
+    fetch_workers: int = 8
+    ui_tick_ms: int = 50
+
+    api_retries: int = 2
+    api_connect_timeout: float = 2
+    api_timeout_sensors: float = 5
+    api_timeout_states: float = 3
+    api_timeout_history: float = 10
+    api_timeout_action: float = 2
+    api_stream: bool = True
+    api_stream_path: str = "/states/stream"
+    # The stream is reconnected when nothing, not even a keep-alive, arrives
+    api_timeout_stream: float = 30
+    api_breaker_failures: int = 3
+    api_breaker_backoff: float = 2
+    api_breaker_max_backoff: float = 60
+
+    action_retries: int = 2
+    action_retry_delay_ms: int = 200
+    action_confirm_polls: int = 3
+    action_confirm_interval_ms: int = 300
+
+    history_limit: int = 10000
+    history_cache_entities: int = 16
+    history_default_range: str = "7d"
+    history_memory_budget_mb: float = 32
+    # float32 history and figure resources released when leaving History
+    low_memory: bool = False
+
+    state_store_path: str = "~/.camper_gui/states.db"
+    state_store_retention_days: int = 31
+    state_store_compact_interval_ms: int = 3600000
+
+    message_log_path: str = "~/.camper_gui/messages.db"
+    message_log_retention_days: int = 28
+    message_log_max_rows: int = 50000
 
 
 class DebugSettings(Settings):
@@ -11,7 +68,9 @@ class DebugSettings(Settings):
 
 
 class ProductionSettings(Settings):
-    pass
+    low_memory: bool = True
+    # About 7500 raw rows per entity next to full rollups
+    history_memory_budget_mb: float = 5
 
 
 if platform.machine() == "x86_64":
@@ -0,0 +1,99 @@
+import time
+
+import customtkinter
+
+from frame_base import FrameBase
+from instrumentation import BUCKET_BOUNDS_MS, metrics, rss_bytes
+
+HEARTBEAT_MS = 250
+BARS = " ▁▂▃▄▅▆▇█"
+
+
+def _sparkline(counts):
+    peak = max(counts)
+    if peak == 0:
+        return ""
+
+    return "".join(
+        BARS[0] if c == 0 else BARS[max(1, round(c / peak * (len(BARS) - 1)))]
+        for c in counts
+    )
+
+
+class DiagnosticsFrame(FrameBase):
+    def __init__(self, master):
+        super().__init__(master)
+        self.master = master
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        self.title_label = self._add_title("Diagnostics", columnspan=1)
+        self.reset_button = customtkinter.CTkButton(
+            self, text="Reset", width=70, command=self.reset_callback
+        )
+        self.reset_button.grid(row=0, column=1, padx=10, pady=(3, 0))
+
+        self.textbox = customtkinter.CTkTextbox(
+            self, font=("DejaVu Sans Mono", 13), wrap="none"
+        )
+        self.textbox.grid(
+            row=1, column=0, padx=10, pady=10, sticky="nsew", columnspan=2
+        )
+        self.textbox.configure(state="disabled")
+
+        # Event loop lag: how late a periodic after() callback runs
+        self.heartbeat_due = time.perf_counter() + HEARTBEAT_MS / 1000
+        self.after(HEARTBEAT_MS, self.heartbeat_runner)
+        self.update_diagnostics_runner()
+
+    def heartbeat_runner(self):
+        now = time.perf_counter()
+        metrics.record("tk lag", max(now - self.heartbeat_due, 0))
+
+        self.heartbeat_due = now + HEARTBEAT_MS / 1000
+        self.after(HEARTBEAT_MS, self.heartbeat_runner)
+
+    def update_diagnostics_runner(self):
+        current_tab = self.master.master.get()
+
+        if current_tab == "Diagnostics":
+            self.update_diagnostics()
+
+        self.after(2000, self.update_diagnostics_runner)
+
+    def reset_callback(self):
+        metrics.reset()
+        self.update_diagnostics()
+
+    def update_diagnostics(self):
+        histograms, gauges = metrics.snapshot()
+
+        bounds = " ".join(f"{b:g}" for b in BUCKET_BOUNDS_MS[:-1])
+        lines = [
+            f"{'timing':<44}{'count':>7}{'mean':>8}{'p50':>7}{'p95':>7}{'max':>8}"
+            f"  ms per bucket ({bounds} +)"
+        ]
+        for name in sorted(histograms):
+            h = histograms[name]
+            lines.append(
+                f"{name[:43]:<44}{h['count']:>7}{h['mean']:>8.1f}{h['p50']:>7.1f}"
+                f"{h['p95']:>7.1f}{h['max']:>8.1f}  {_sparkline(h['buckets'])}"
+            )
+
+        lines.append("")
+        rss = rss_bytes()
+        if rss is not None:
+            lines.append(f"{'process RSS':<44}{rss / 2**20:>7.1f} MB")
+        for name in sorted(gauges):
+            lines.append(f"{name:<44}{gauges[name]:>7}")
+
+        text = "\n".join(lines)
+        if self._rendered.get(self.textbox, {}).get("text") == text:
+            return
+
+        self._rendered.setdefault(self.textbox, {})["text"] = text
+        self.textbox.configure(state="normal")
+        self.textbox.delete("1.0", "end")
+        self.textbox.insert("1.0", text)
+        self.textbox.configure(state="disabled")
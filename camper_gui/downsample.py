@@ -0,0 +1,55 @@
+import numpy as np
+
+
+def lttb(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: keeps the points that best preserve the
+    # visual shape of the line, including short spikes and dips.
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    x_f = x.astype(np.float64)
+    y_f = y.astype(np.float64)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], max(edges[i + 1], edges[i] + 1)
+
+        if i + 2 < len(edges):
+            next_start, next_stop = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+        else:
+            next_start, next_stop = n - 1, n
+        avg_x = x_f[next_start:next_stop].mean()
+        avg_y = y_f[next_start:next_stop].mean()
+
+        area = np.abs(
+            (x_f[a] - avg_x) * (y_f[start:stop] - y_f[a])
+            - (x_f[a] - x_f[start:stop]) * (avg_y - y_f[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return x[selected], y[selected]
+
+
+def minmax_envelope(x, y, n_bins):
+    # Min, max and mean of y per equal-width x bin, x must be sorted.
+    if len(x) == 0:
+        return x, y, y, y
+
+    x_i = x.astype(np.int64)
+    edges = np.linspace(x_i[0], x_i[-1], n_bins + 1)
+    starts = np.unique(np.searchsorted(x_i, edges[:-1], side="left"))
+    starts = starts[starts < len(x_i)]
+
+    y_min = np.minimum.reduceat(y, starts)
+    y_max = np.maximum.reduceat(y, starts)
+    counts = np.diff(np.append(starts, len(y)))
+    y_mean = np.add.reduceat(y, starts) / counts
+
+    return x[starts], y_min, y_max, y_mean
@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import deque
+from concurrent import futures
+
+from config import settings
+from instrumentation import metrics
+
+# Task lanes, a lower number runs first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+
+class TaskScheduler:
+    # Worker threads over one queue per priority. A task submitted with the
+    # key of a task still queued replaces it, and the queue holds at most
+    # max_queued tasks: when full the oldest task of the lowest priority
+    # lane, not above the new task's priority, is dropped to make room.
+    def __init__(self, workers, max_queued):
+        self.max_queued = max_queued
+
+        self.condition = threading.Condition()
+        self.lanes = [deque() for _ in (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)]
+        self.entry_by_key = {}
+        self.stopped = False
+
+        self.threads = [
+            threading.Thread(target=self._worker, name=f"task_{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def _queued(self):
+        return sum(len(lane) for lane in self.lanes)
+
+    def submit(self, fn, args, key, priority):
+        with self.condition:
+            if self.stopped:
+                raise RuntimeError("cannot schedule new tasks after shutdown")
+
+            entry = self.entry_by_key.get(key) if key is not None else None
+            if entry is not None:
+                # Newer work for the same key, it keeps the queued task's place
+                entry["fn"] = fn
+                entry["args"] = args
+                if priority < entry["priority"]:
+                    self.lanes[entry["priority"]].remove(entry)
+                    self.lanes[priority].append(entry)
+                    entry["priority"] = priority
+
+                return entry["future"]
+
+            future = futures.Future()
+            if self._queued() >= self.max_queued and not self._drop(priority):
+                future.cancel()
+                metrics.add_gauge("task dropped", 1)
+                return future
+
+            entry = {
+                "fn": fn,
+                "args": args,
+                "key": key,
+                "priority": priority,
+                "future": future,
+                "submitted": time.perf_counter(),
+            }
+            self.lanes[priority].append(entry)
+            if key is not None:
+                self.entry_by_key[key] = entry
+
+            metrics.set_gauge("task queue depth", self._queued())
+            self.condition.notify()
+
+        return future
+
+    def _drop(self, priority):
+        for lane_priority in range(len(self.lanes) - 1, priority - 1, -1):
+            lane = self.lanes[lane_priority]
+            if lane:
+                entry = lane.popleft()
+                if entry["key"] is not None:
+                    self.entry_by_key.pop(entry["key"], None)
+                entry["future"].cancel()
+                metrics.add_gauge("task dropped", 1)
+
+                return True
+
+        return False
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                while not self.stopped and not any(self.lanes):
+                    self.condition.wait()
+
+                if self.stopped:
+                    return
+
+                entry = next(lane for lane in self.lanes if lane).popleft()
+                if entry["key"] is not None:
+                    self.entry_by_key.pop(entry["key"], None)
+
+                metrics.set_gauge("task queue depth", self._queued())
+
+            metrics.record("task wait", time.perf_counter() - entry["submitted"])
+
+            future = entry["future"]
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                result = entry["fn"](*entry["args"])
+            except BaseException as ex:
+                future.set_exception(ex)
+            else:
+                future.set_result(result)
+
+    def shutdown(self):
+        with self.condition:
+            self.stopped = True
+            for lane in self.lanes:
+                for entry in lane:
+                    entry["future"].cancel()
+                lane.clear()
+            self.entry_by_key.clear()
+
+            self.condition.notify_all()
+
+
+class FetchEngine:
+    def __init__(self, task_workers=None, fetch_workers=None):
+        # Tasks (polls, plot loads, actions) may fan out into fetches, so the
+        # two run on separate pools to avoid a task waiting on its own pool.
+        self.task_scheduler = TaskScheduler(
+            task_workers or settings.task_workers, settings.task_queue_limit
+        )
+        self.fetch_executor = futures.ThreadPoolExecutor(
+            max_workers=fetch_workers or settings.fetch_workers,
+            thread_name_prefix="fetch",
+        )
+
+    def _submit_fetch(self, fn, item):
+        # Queue depth and time waiting for a worker
+        submitted = time.perf_counter()
+        metrics.add_gauge("fetch queue depth", 1)
+
+        def run():
+            metrics.add_gauge("fetch queue depth", -1)
+            metrics.record("fetch wait", time.perf_counter() - submitted)
+
+            return fn(item)
+
+        return self.fetch_executor.submit(run)
+
+    def submit(self, fn, *args, key=None, priority=PRIORITY_NORMAL):
+        return self.task_scheduler.submit(fn, args, key, priority)
+
+    def fetch_all(self, fn, items):
+        fetch_futures = [self._submit_fetch(fn, item) for item in items]
+
+        return [f.result() for f in fetch_futures]
+
+    def fetch_each(self, fn, items):
+        # Yields (item, result) pairs as soon as each fetch completes
+        item_by_future = {self._submit_fetch(fn, item): item for item in items}
+
+        for future in futures.as_completed(item_by_future):
+            yield item_by_future[future], future.result()
+
+    def shutdown(self):
+        self.task_scheduler.shutdown()
+        self.fetch_executor.shutdown(wait=False, cancel_futures=True)
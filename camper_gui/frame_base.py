@@ -2,6 +2,29 @@ import customtkinter
 
 
 class FrameBase(customtkinter.CTkFrame):
+    def __init__(self, master, **kwargs):
+        super().__init__(master, **kwargs)
+        # Last rendered value per widget option, customtkinter redraws on
+        # every configure() so unchanged values are skipped.
+        self._rendered = {}
+
+    def _configure(self, widget, **kwargs):
+        rendered = self._rendered.setdefault(widget, {})
+        changed = {
+            k: v for k, v in kwargs.items() if k not in rendered or rendered[k] != v
+        }
+
+        if changed:
+            widget.configure(**changed)
+            rendered.update(changed)
+
+    def _set_value(self, widget, value):
+        rendered = self._rendered.setdefault(widget, {})
+
+        if "value" not in rendered or rendered["value"] != value:
+            widget.set(value)
+            rendered["value"] = value
+
     def _add_title(self, label_text, row=0, column=0, columnspan=2):
         title_label = customtkinter.CTkLabel(
             self, text=label_text, fg_color="gray30", corner_radius=6
@@ -1,90 +1,183 @@
 import customtkinter
-import tkinter
-import requests
+import time
 import matplotlib
 
 matplotlib.use("TkAgg")
 
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.collections import PolyCollection
+from matplotlib.patches import Polygon
 import matplotlib.dates as mdates
-import pandas as pd
+import numpy as np
 
+from api_client import ApiException, ApiOffline
 from config import settings
+from downsample import lttb, minmax_envelope
+from history_cache import HistoryCache
+from instrumentation import metrics
+from rollups import NS_PER_S
 
+# Same colours as the buttons on the Status tab
+STATE_COLORS = {"ON": "green", "OFF": "darkred", "PENDING": "orange"}
+OTHER_STATE_COLORS = ("tab:blue", "tab:purple", "tab:cyan", "tab:olive", "tab:brown")
 
-class ApiException(Exception):
-    pass
+# Selectable time ranges in seconds
+RANGES = {"1h": 3600, "6h": 6 * 3600, "24h": 86400, "7d": 7 * 86400, "30d": 30 * 86400}
+MIN_SPAN_S = 15 * 60
+MAX_SPAN_S = 31 * 86400
+
+
+def _to_num(stamp_ns):
+    return mdates.date2num(np.datetime64(int(stamp_ns), "ns"))
+
+
+def _format_time_axis(ax):
+    locator = mdates.AutoDateLocator()
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
 
 
 class EntityFrame(customtkinter.CTkScrollableFrame):
     def __init__(self, master, statusbar, click_callback=None):
         super().__init__(master)
         self.statusbar = statusbar
-        self.radio_var = tkinter.StringVar(value=None)
-        self.radiobuttons = []
+        self.checkboxes = {}
+        self.selected = []
         self.click_callback = click_callback
 
-    def _clicked(self):
+    def _clicked(self, text):
+        if self.checkboxes[text].get():
+            self.selected.append(text)
+        elif text in self.selected:
+            self.selected.remove(text)
+
         if self.click_callback:
             self.click_callback()
 
     def add(self, text):
-        self.radiobuttons.append(
-            customtkinter.CTkRadioButton(
-                self,
-                text=text.replace("_", " "),
-                variable=self.radio_var,
-                value=text,
-                command=self._clicked,
-            )
+        checkbox = customtkinter.CTkCheckBox(
+            self,
+            text=text.replace("_", " "),
+            command=lambda: self._clicked(text),
         )
-        self.radiobuttons[-1].grid(
-            row=len(self.radiobuttons) - 1,
+        checkbox.grid(
+            row=len(self.checkboxes),
             column=0,
             padx=10,
             pady=(10, 0),
             sticky="w",
         )
+        self.checkboxes[text] = checkbox
+
+    def set_items(self, texts):
+        # Keep checkboxes, and their selection, for names that remain
+        for text in list(self.checkboxes):
+            if text not in texts:
+                self.checkboxes.pop(text).destroy()
+                if text in self.selected:
+                    self.selected.remove(text)
+
+        for text in texts:
+            if text not in self.checkboxes:
+                self.add(text)
+
+        for row, text in enumerate(texts):
+            self.checkboxes[text].grid(row=row)
 
     def get(self):
-        return self.radio_var.get()
+        # Selected entity names in the order they were ticked
+        return tuple(self.selected)
 
     def reset(self):
-        self.radio_var.set(-1)
+        for checkbox in self.checkboxes.values():
+            checkbox.deselect()
+
+        self.selected = []
 
 
 class GraphFrame(customtkinter.CTkFrame):
-    def __init__(self, master, statusbar, api_sensors, executor):
+    def __init__(
+        self,
+        master,
+        statusbar,
+        ui_queue,
+        api_client,
+        state_store,
+        api_sensors,
+        executor,
+    ):
         super().__init__(master)
         self.statusbar = statusbar
+        self.ui_queue = ui_queue
+        self.api_client = api_client
         self.executor = executor
+        self.history_cache = HistoryCache(api_client, state_store)
 
         self.grid_columnconfigure(0, weight=1)
         self.grid_columnconfigure(1, weight=3)
 
         f = Figure(figsize=(4, 4.7), dpi=100)
         self.ax = f.add_subplot(111)
-        self.plot_x = []
-        self.plot_y = []
 
         self.canvas = FigureCanvasTkAgg(f, self)
 
+        # Numeric plots keep their artists between refreshes and are blitted
+        # onto a cached background while the axes limits still fit.
+        self.numeric_artists = None
+        self.plotted_entity_name = None
+        self.background = None
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+
+        # Extra y-axes of overlay plots, one per additional unit
+        self.twin_axes = []
+
+        # Visible time window, view_end_ns None follows the latest data
+        self.view_span_ns = RANGES[settings.history_default_range] * NS_PER_S
+        self.view_end_ns = None
+        self.requested_plot = None
+
         self.canvas.draw()
         self.canvas.get_tk_widget().grid(
             row=0, column=1, padx=10, pady=2, sticky="ew", columnspan=1
         )
-        self.entity_id_by_name = {}
+
+        self.controls_frame = customtkinter.CTkFrame(self, fg_color="transparent")
+        self.controls_frame.grid(row=1, column=1, padx=10, pady=2, sticky="ew")
+        self.range_button = customtkinter.CTkSegmentedButton(
+            self.controls_frame, values=list(RANGES), command=self._range_callback
+        )
+        self.range_button.set(settings.history_default_range)
+        self.range_button.grid(row=0, column=0, padx=(0, 10), sticky="w")
+
+        for column, (text, command) in enumerate(
+            (
+                ("<", lambda: self._pan_callback(-1)),
+                (">", lambda: self._pan_callback(1)),
+                ("+", lambda: self._zoom_callback(0.5)),
+                ("-", lambda: self._zoom_callback(2)),
+            ),
+            start=1,
+        ):
+            customtkinter.CTkButton(
+                self.controls_frame, text=text, width=40, command=command
+            ).grid(row=0, column=column, padx=2)
         self.entity_frame = EntityFrame(
             self, self.statusbar, self._change_plot_callback
         )
         self.entity_frame.grid(
-            row=0, column=0, padx=10, pady=2, sticky="nsew", columnspan=1
+            row=0, column=0, padx=10, pady=2, sticky="nsew", columnspan=1, rowspan=2
         )
 
+        self.set_sensors(api_sensors)
+
+        # self.update_plot_runner()
+
+    def set_sensors(self, api_sensors):
+        entity_id_by_name = {}
         for sensor in api_sensors:
             for entity in sensor["entities"]:
-                self.entity_id_by_name[f"{sensor['name']}_{entity['name']}"] = {
+                entity_id_by_name[f"{sensor['name']}_{entity['name']}"] = {
                     "entity_id": entity["id"],
                     "entity_name": entity["name"],
                     "unit": entity["unit"],
@@ -92,144 +185,541 @@ class GraphFrame(customtkinter.CTkFrame):
                     "sensor_name": sensor["name"],
                 }
 
-        self.checkboxes = []
+        self.entity_id_by_name = entity_id_by_name
+        self.entity_frame.set_items(list(entity_id_by_name))
 
-        for k, v in self.entity_id_by_name.items():
-            self.entity_frame.add(k)
-
-        # self.update_plot_runner()
+        if self.requested_plot is not None:
+            self._request_plot()
 
     def _change_plot_callback(self):
-        self.executor.submit(self.update_plot)
+        self._request_plot()
+
+    def _range_callback(self, value):
+        self.view_span_ns = RANGES[value] * NS_PER_S
+        self.view_end_ns = None
+        self._request_plot()
+
+    def _pan_callback(self, direction):
+        end = self._view_window()[1] + direction * self.view_span_ns // 2
+        self.view_end_ns = None if end >= time.time_ns() else end
+        self._request_plot()
+
+    def _zoom_callback(self, factor):
+        span_s = min(
+            max(self.view_span_ns * factor // NS_PER_S, MIN_SPAN_S), MAX_SPAN_S
+        )
+        self.view_span_ns = int(span_s) * NS_PER_S
+
+        range_name = next((k for k, v in RANGES.items() if v == span_s), "")
+        self.range_button.set(range_name)
+        self._request_plot()
+
+    def _view_window(self):
+        if self.view_end_ns is None:
+            end = time.time_ns()
+        else:
+            end = self.view_end_ns
+
+        return end - self.view_span_ns, end
+
+    def _request_plot(self):
+        self.requested_plot = (self.entity_frame.get(), self._view_window())
+        # A newer selection or window replaces a plot load still queued
+        self.executor.submit(self.update_plot, *self.requested_plot, key=("plot", self))
 
     def update_plot_runner(self):
         current_tab = self.master.master.get()
 
         if current_tab == "History":
-            self.executor.submit(self.update_plot)
+            self._request_plot()
         else:
-            self.ax.clear()
-            self.canvas.draw()
+            self._clear_plot()
 
         self.after(5000, self.update_plot_runner)
 
     def reset(self):
         self.entity_frame.reset()
-        self.ax.clear()
-        self.canvas.draw()
+        self.requested_plot = None
+        self._clear_plot()
 
-    def update_plot(self):
-        entity = None
+    def release(self):
+        # Drop the plot and the cached history while History is not shown,
+        # they are rebuilt from the state store when it is.
+        self.entity_frame.reset()
+        self.requested_plot = None
+        self._clear_plot()
+        self.history_cache.clear()
 
-        entity_name = self.entity_frame.get()
-        if entity_name:
-            entity = self.entity_id_by_name[entity_name]
+    def _clear_plot(self):
+        self._reset_axes()
+        self._draw()
 
-        if entity is None:
-            states_resp = None
-        else:
-            try:
-                states_resp = requests.get(
-                    f"{settings.api_base}/entities/{entity['entity_id']}/states",
-                    params={"limit": 10000},
-                    timeout=3,
-                )
-            except (
-                requests.exceptions.Timeout,
-                requests.exceptions.ConnectionError,
-                ApiException,
-            ) as ex:
-                states_resp = None
-                self.statusbar.add_message(
-                    f"Could not retrieve entity data from API: {ex.__class__.__name__}",
-                    details=str(ex),
-                )
+    def _draw(self):
+        with metrics.timer("canvas draw"):
+            self.canvas.draw()
 
-        if states_resp and len(states_resp.json()):
-            try:
-                states_df = pd.DataFrame(states_resp.json())
-                states_df["created"] = pd.to_datetime(states_df["created"])
-
-                try:
-                    states_df["state"] = pd.to_numeric(states_df["state"])
-                    is_numeric = True
-                except ValueError:
-                    is_numeric = False
-
-                if is_numeric is False:
-                    # Handle string states
-                    states_df["state"] = states_df["state"].astype(str)
-                    states_df = states_df.set_index("created")
-
-                    # Plot string states over time
-                    self.ax.clear()
-                    for state in states_df["state"].unique():
-                        state_df = states_df[states_df["state"] == state]
-                        self.ax.plot(
-                            state_df.index, [state] * len(state_df), "o", label=state
-                        )
-
-                    self.ax.set_title(entity["sensor_name"])
-                    self.ax.set_ylabel(entity["entity_name"])
-                    self.ax.xaxis.set_major_locator(mdates.HourLocator(interval=24))
-                    self.ax.xaxis.set_major_formatter(mdates.DateFormatter("%m-%d"))
-
-                    self.ax.grid()
-                    self.canvas.draw()
-                else:
-                    states_df["state"] = pd.to_numeric(states_df["state"])
-                    states_df = states_df.set_index("created")
+    def _reset_axes(self):
+        for ax in self.twin_axes:
+            ax.remove()
 
-                    # Resample to 8-hour intervals and calculate min, max, and mean
-                    hourly_df = states_df.resample("4h").agg(["min", "max", "mean"])
+        self.twin_axes = []
+        self.ax.clear()
+        self.numeric_artists = None
+        self.plotted_entity_name = None
+        self.background = None
+
+    def _on_draw(self, event):
+        # A full draw skips animated artists, capture the clean background and
+        # draw them on top. Also runs after resizes.
+        if self.numeric_artists is None:
+            return
+
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self._draw_numeric_artists()
+
+    def _draw_numeric_artists(self):
+        for artist in self.numeric_artists:
+            self.ax.draw_artist(artist)
+
+    def update_plot(self, entity_names, view):
+        # Runs on a worker: fetch and aggregate, then hand the result to the
+        # Tk thread for drawing.
+        entities = [
+            self.entity_id_by_name[name]
+            for name in entity_names
+            if name in self.entity_id_by_name
+        ]
+
+        if len(entities) == 0:
+            self._post_plot(entity_names, view, None, None)
+        elif len(entities) == 1:
+            self._update_single(entity_names, view, entities[0])
+        else:
+            self._update_overlay(entity_names, view, entities)
+
+    def _update_single(self, entity_names, view, entity):
+        # Show what is held locally right away, then refresh it with the
+        # records that arrived since.
+        cached = self.history_cache.load_local(entity["entity_id"])
+        if cached is not None:
+            self._post_plot(entity_names, view, entity, cached)
+
+        history = self._load_history(entity, cached)
+
+        if cached is None or history is not cached:
+            self._post_plot(entity_names, view, entity, history)
+
+    def _update_overlay(self, entity_names, view, entities):
+        # Fetch all selected entities concurrently, the slowest one bounds
+        # the total latency.
+        histories = self.executor.fetch_all(self._load_history, entities)
+
+        plot_data = None
+        try:
+            plot_data = self._prepare_overlay(entities, histories, view)
+        except Exception as ex:
+            self.statusbar.add_message(
+                f"Could not plot overlay: {ex.__class__.__name__}",
+                details=str(ex),
+            )
 
-                    # Plot the average values
-                    self.ax.clear()
-                    hourly_df["state"]["mean"].plot(
-                        ax=self.ax, label="Avg", color="green"
-                    )
-                    self.ax.fill_between(
-                        hourly_df.index,
-                        hourly_df["state"]["min"],
-                        hourly_df["state"]["max"],
-                        color="gray",
-                        alpha=0.2,
-                    )
+        self.ui_queue.post(
+            self.render_plot,
+            entity_names,
+            view,
+            entities,
+            plot_data,
+            key=("plot", self),
+        )
 
-                    # Plot the min and max values as darker gray lines
-                    hourly_df["state"]["min"].plot(
-                        ax=self.ax, label="Min", color="darkgray", linestyle="--"
-                    )
-                    hourly_df["state"]["max"].plot(
-                        ax=self.ax, label="Max", color="darkgray", linestyle="--"
-                    )
+    def _load_history(self, entity, cached=None):
+        try:
+            return self.history_cache.get_states(entity["entity_id"])
+        except ApiOffline:
+            pass
+        except ApiException as ex:
+            self.statusbar.add_message(
+                f"Could not retrieve entity data from API: {ex.__class__.__name__}",
+                details=str(ex),
+            )
 
-                    self.ax.set_title(entity["sensor_name"])
-                    self.ax.grid()
+        if cached is None:
+            cached = self.history_cache.load_local(entity["entity_id"])
 
-                    if entity["unit"]:
-                        self.ax.set_ylabel(
-                            f"{entity['entity_name']} [{entity['unit']}]"
-                        )
-                    else:
-                        self.ax.set_ylabel(entity["entity_name"])
+        return cached
 
-                    self.canvas.draw()
+    def _post_plot(self, entity_names, view, entity, history):
+        entity_name = " ".join(entity_names)
 
+        plot_data = None
+        if history is not None and len(history):
+            try:
+                plot_data = self._prepare_plot(entity, history, view)
             except ValueError as ex:
-                self.ax.clear()
-                self.canvas.draw()
                 self.statusbar.add_message(
                     f"Could not convert data for {entity_name}: {ex.__class__.__name__}",
                     details=str(ex),
                 )
             except Exception as ex:
-                self.ax.clear()
-                self.canvas.draw()
                 self.statusbar.add_message(
                     f"Could not plot data for {entity_name}: {ex.__class__.__name__}",
                     details=str(ex),
                 )
+
+        self.ui_queue.post(
+            self.render_plot, entity_names, view, entity, plot_data, key=("plot", self)
+        )
+
+    def _prepare_plot(self, entity, history, view):
+        if not history.is_numeric:
+            return self._prepare_timeline(history, view)
+
+        lo, hi = view
+        n_px = max(int(self.ax.bbox.width), 100)
+        i, j, rollups = self._window_source(entity, history, view, n_px)
+
+        if rollups is None:
+            state = history.state[i:j]
+            valid = ~np.isnan(state)
+            created = history.created[i:j][valid]
+            state = state[valid]
+
+            # One point per pixel column of the axes: LTTB keeps the shape of
+            # the line, the envelope keeps every spike within a column.
+            line_x, line_y = lttb(created, state, n_px)
+            env_x, env_min, env_max, _ = minmax_envelope(created, state, n_px)
         else:
-            self.ax.clear()
-            self.canvas.draw()
+            env_x, line_y, env_min, env_max = rollups.select(lo, hi, 2 * n_px)
+            env_x = env_x.astype("datetime64[ns]")
+            line_x = env_x
+
+        if len(env_x) == 0:
+            return None
+
+        line_x = mdates.date2num(line_x)
+        env_x = mdates.date2num(env_x)
+
+        return {
+            "kind": "numeric",
+            "line": (line_x, line_y),
+            "envelope": (env_x, env_min, env_max),
+            "fill": np.column_stack(
+                [
+                    np.concatenate([env_x, env_x[::-1]]),
+                    np.concatenate([env_max, env_min[::-1]]),
+                ]
+            ),
+            "x_range": (_to_num(lo), _to_num(hi)),
+            "live": self.view_end_ns is None,
+        }
+
+    def _window_source(self, entity, history, view, n_px):
+        # Raw samples while they cover the window and stay cheap to reduce,
+        # otherwise the pre-aggregated rollups. Returns the index range of the
+        # window in history and the rollups to use, or None for raw samples.
+        lo, hi = view
+        created_ns = history.created.view(np.int64)
+        i, j = np.searchsorted(created_ns, [lo, hi])
+
+        rollups = self.history_cache.get_rollups(entity["entity_id"])
+        if rollups is None or (
+            j - i <= 4 * n_px
+            and (created_ns[0] <= lo or rollups.first_ns >= created_ns[0])
+        ):
+            return i, j, None
+
+        return i, j, rollups
+
+    def _prepare_timeline(self, history, view):
+        # Collapse consecutive equal states into spans, each span becomes one
+        # rectangle on the row of its state. The state active at the start of
+        # the window is kept and clipped to it.
+        lo, hi = view
+        created_ns = history.created.view(np.int64)
+        i = max(np.searchsorted(created_ns, lo) - 1, 0)
+        j = np.searchsorted(created_ns, hi)
+        if j <= i:
+            return None
+
+        created = mdates.date2num(history.created[i:j])
+        created[0] = max(created[0], _to_num(lo))
+        codes = history.state[i:j]
+
+        changes = np.flatnonzero(np.diff(codes)) + 1
+        starts = np.concatenate([[0], changes])
+        span_codes = codes[starts]
+
+        # The last state holds until the next record after the window, or
+        # until now when there is none yet
+        if j < len(created_ns):
+            last_end = _to_num(hi)
+        else:
+            last_end = _to_num(min(time.time_ns(), hi))
+        span_start = created[starts]
+        span_end = np.concatenate([created[changes], [last_end]])
+
+        y_low = span_codes - 0.4
+        y_high = span_codes + 0.4
+        verts = np.stack(
+            [
+                np.column_stack([span_start, y_low]),
+                np.column_stack([span_start, y_high]),
+                np.column_stack([span_end, y_high]),
+                np.column_stack([span_end, y_low]),
+            ],
+            axis=1,
+        )
+
+        category_colors = [
+            STATE_COLORS.get(state, OTHER_STATE_COLORS[i % len(OTHER_STATE_COLORS)])
+            for i, state in enumerate(history.categories)
+        ]
+
+        return {
+            "kind": "timeline",
+            "verts": verts,
+            "colors": [category_colors[c] for c in span_codes],
+            "categories": history.categories,
+            "x_range": (_to_num(lo), _to_num(hi)),
+        }
+
+    def _prepare_overlay(self, entities, histories, view):
+        series = []
+        for entity, history in zip(entities, histories):
+            if history is None or len(history) == 0:
+                continue
+
+            if not history.is_numeric:
+                self.statusbar.add_message(
+                    f"{entity['sensor_name']} {entity['entity_name']} is not "
+                    "numeric and is left out of the overlay",
+                    state="warning",
+                )
+                continue
+
+            series.append((entity, history))
+
+        if not series:
+            return None
+
+        # Bin every series onto one shared time grid over the window in a
+        # single pass: the flat bin index combines series number and time bin.
+        # Long windows bin the rollup buckets instead of the raw samples.
+        n_bins = max(int(self.ax.bbox.width), 100)
+        start, end = view
+        span = end - start
+
+        created = []
+        states = []
+        for entity, history in series:
+            i, j, rollups = self._window_source(entity, history, view, n_bins)
+            if rollups is None:
+                created.append(history.created.view(np.int64)[i:j])
+                states.append(history.state[i:j])
+            else:
+                bucket_start, mean, _, _ = rollups.select(start, end, 2 * n_bins)
+                created.append(bucket_start)
+                states.append(mean)
+
+        all_created = np.concatenate(created)
+        all_state = np.concatenate(states).astype(np.float64)
+        series_index = np.repeat(np.arange(len(series)), [len(c) for c in created])
+
+        valid = ~np.isnan(all_state) & (all_created >= start) & (all_created < end)
+        bins = ((all_created[valid] - start) / span * n_bins).astype(np.int64)
+        flat = series_index[valid] * n_bins + np.clip(bins, 0, n_bins - 1)
+
+        size = len(series) * n_bins
+        sums = np.bincount(flat, weights=all_state[valid], minlength=size)
+        counts = np.bincount(flat, minlength=size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = (sums / counts).reshape(len(series), n_bins)
+
+        grid = start + (np.arange(n_bins) + 0.5) * span / n_bins
+        x = mdates.date2num(grid.astype(np.int64).astype("datetime64[ns]"))
+
+        # Entities sampled less often than the bin width leave most bins
+        # empty, only the filled ones are plotted so the line stays connected
+        plotted = []
+        for k, (entity, _) in enumerate(series):
+            filled = counts[k * n_bins : (k + 1) * n_bins] > 0
+            plotted.append((entity, x[filled], means[k][filled]))
+
+        return {
+            "kind": "overlay",
+            "x_range": (_to_num(start), _to_num(end)),
+            "series": plotted,
+        }
+
+    def render_plot(self, entity_names, view, entity, plot_data):
+        # A slower load for a previous selection or window may finish last,
+        # drop it.
+        if (entity_names, view) != self.requested_plot:
+            return
+
+        if plot_data is None:
+            self._clear_plot()
+            return
+
+        entity_name = " ".join(entity_names)
+        try:
+            if plot_data["kind"] == "overlay":
+                self._render_overlay(plot_data)
+            elif plot_data["kind"] == "timeline":
+                self._render_timeline(entity, plot_data)
+            else:
+                self._render_numeric(entity_name, entity, plot_data)
+        except Exception as ex:
+            self._clear_plot()
+            self.statusbar.add_message(
+                f"Could not plot data for {entity_name}: {ex.__class__.__name__}",
+                details=str(ex),
+            )
+
+    def _render_overlay(self, plot_data):
+        self._reset_axes()
+
+        axes_by_unit = {}
+        lines = []
+        for i, (entity, x, values) in enumerate(plot_data["series"]):
+            unit = entity["unit"] or ""
+
+            if unit not in axes_by_unit:
+                if not axes_by_unit:
+                    ax = self.ax
+                else:
+                    ax = self.ax.twinx()
+                    ax.spines["right"].set_position(
+                        ("axes", 1 + 0.15 * len(self.twin_axes))
+                    )
+                    self.twin_axes.append(ax)
+
+                ax.set_ylabel(f"[{unit}]" if unit else "")
+                axes_by_unit[unit] = ax
+
+            (line,) = axes_by_unit[unit].plot(
+                x,
+                values,
+                color=f"C{i}",
+                label=f"{entity['sensor_name']} {entity['entity_name']}",
+            )
+            lines.append(line)
+
+        self.ax.legend(handles=lines, fontsize="small", loc="upper left")
+        self.ax.set_xlim(*plot_data["x_range"])
+        self.ax.xaxis_date()
+        _format_time_axis(self.ax)
+        self.ax.grid()
+
+        self._draw()
+
+    def _render_timeline(self, entity, plot_data):
+        self._reset_axes()
+
+        # Plot string states over time as one collection of state spans
+        categories = plot_data["categories"]
+        self.ax.add_collection(
+            PolyCollection(
+                plot_data["verts"], facecolors=plot_data["colors"], linewidths=0
+            )
+        )
+        self.ax.set_xlim(*plot_data["x_range"])
+        self.ax.set_ylim(-0.5, len(categories) - 0.5)
+        self.ax.set_yticks(range(len(categories)), categories)
+
+        self.ax.set_title(entity["sensor_name"])
+        self.ax.set_ylabel(entity["entity_name"])
+        self.ax.xaxis_date()
+        _format_time_axis(self.ax)
+
+        self.ax.grid(axis="x")
+        self._draw()
+
+    def _create_numeric_artists(self, entity):
+        self._reset_axes()
+        self.ax.xaxis_date()
+        _format_time_axis(self.ax)
+
+        fill = Polygon(np.zeros((1, 2)), color="gray", alpha=0.2, animated=True)
+        self.ax.add_patch(fill)
+
+        # Plot the downsampled values
+        (value_line,) = self.ax.plot(
+            [], [], label="Value", color="green", animated=True
+        )
+
+        # Plot the min and max values as darker gray lines
+        (min_line,) = self.ax.plot(
+            [],
+            [],
+            drawstyle="steps-post",
+            label="Min",
+            color="darkgray",
+            linestyle="--",
+            animated=True,
+        )
+        (max_line,) = self.ax.plot(
+            [],
+            [],
+            drawstyle="steps-post",
+            label="Max",
+            color="darkgray",
+            linestyle="--",
+            animated=True,
+        )
+        self.numeric_artists = (fill, value_line, min_line, max_line)
+
+        self.ax.set_title(entity["sensor_name"])
+        self.ax.grid()
+
+        if entity["unit"]:
+            self.ax.set_ylabel(f"{entity['entity_name']} [{entity['unit']}]")
+        else:
+            self.ax.set_ylabel(entity["entity_name"])
+
+    def _render_numeric(self, entity_name, entity, plot_data):
+        full_draw = False
+        if self.numeric_artists is None or self.plotted_entity_name != entity_name:
+            self._create_numeric_artists(entity)
+            self.plotted_entity_name = entity_name
+            full_draw = True
+
+        fill, value_line, min_line, max_line = self.numeric_artists
+        line_x, line_y = plot_data["line"]
+        env_x, env_min, env_max = plot_data["envelope"]
+
+        value_line.set_data(line_x, line_y)
+        min_line.set_data(env_x, env_min)
+        max_line.set_data(env_x, env_max)
+        fill.set_xy(plot_data["fill"])
+
+        x_min, x_max = plot_data["x_range"]
+        x_span = x_max - x_min
+        y_min, y_max = np.nanmin(env_min), np.nanmax(env_max)
+        cur_x_min, cur_x_max = self.ax.get_xlim()
+        cur_y_min, cur_y_max = self.ax.get_ylim()
+
+        if (
+            full_draw
+            or self.background is None
+            or x_min < cur_x_min
+            or x_min > cur_x_min + x_span * 0.1
+            or x_max > cur_x_max
+            or y_min < cur_y_min
+            or y_max > cur_y_max
+        ):
+            # Following the latest data leaves headroom, so live refreshes
+            # still fit and can be blitted instead of redrawing ticks and grid.
+            y_pad = max(y_max - y_min, 1) * 0.05
+            if plot_data["live"]:
+                self.ax.set_xlim(x_min, x_max + x_span * 0.1)
+            else:
+                self.ax.set_xlim(x_min, x_max)
+            self.ax.set_ylim(y_min - y_pad, y_max + y_pad)
+
+            self._draw()
+        else:
+            with metrics.timer("canvas blit"):
+                self.canvas.restore_region(self.background)
+                self._draw_numeric_artists()
+                self.canvas.blit(self.ax.bbox)
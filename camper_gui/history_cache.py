@@ -0,0 +1,157 @@
+import copy
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from config import settings
+from history_columns import (
+    STATE_DTYPE,
+    HistoryColumns,
+    decode_states,
+    from_rows,
+    to_rows,
+)
+from rollups import RollupPyramid, max_rollup_nbytes
+
+# Raw rows kept in memory per entity however small the budget
+MIN_MEMORY_ROWS = 1000
+
+
+class HistoryCache:
+    def __init__(self, api_client, state_store, max_entities=None, max_rows=None):
+        self.api_client = api_client
+        self.state_store = state_store
+        self.max_entities = max_entities or settings.history_cache_entities
+        self.max_rows = max_rows or settings.history_limit
+        # Least recently used entities are dropped to stay within the budget
+        self.max_bytes = settings.history_memory_budget_mb * 2**20
+        # Each entity's share of the budget, less its rollups, caps the raw
+        # rows it keeps in memory. Older records are plotted from the rollups.
+        row_nbytes = 8 + np.dtype(STATE_DTYPE).itemsize
+        share = self.max_bytes / self.max_entities - max_rollup_nbytes()
+        self.max_memory_rows = int(
+            min(self.max_rows, max(share // row_nbytes, MIN_MEMORY_ROWS))
+        )
+
+        self.lock = threading.Lock()
+        self.history_by_entity = OrderedDict()
+        self.rollups_by_entity = {}
+        # Newest API history record per entity fetched during this session,
+        # the store holds everything up to it. Until an entity is fetched in
+        # full local history may have gaps, so it is not used for `since`.
+        # Kept when the history itself is evicted or cleared.
+        self.synced_until_by_entity = {}
+        # Plot loads of one entity may run on several workers at once
+        self.lock_by_entity = {}
+
+    def load_local(self, entity_id):
+        # Memory first, then the on-device store, without touching the API
+        with self.lock:
+            cached = self.history_by_entity.get(entity_id)
+
+        if cached is None:
+            cached = from_rows(*self.state_store.read(entity_id, self.max_rows))
+
+            if len(cached) == 0:
+                return None
+
+            cached = self._put(entity_id, cached, self._build_rollups(cached))
+
+        return cached
+
+    def get_states(self, entity_id):
+        # One fetch per entity at a time, concurrent ones would fetch and fold
+        # the same delta twice
+        with self.lock:
+            entity_lock = self.lock_by_entity.setdefault(entity_id, threading.Lock())
+
+        with entity_lock:
+            return self._get_states(entity_id)
+
+    def _get_states(self, entity_id):
+        cached = self.load_local(entity_id)
+
+        since = self.synced_until_by_entity.get(entity_id)
+        if cached is None:
+            since = None
+
+        new_history = self.api_client.get_entity_states(
+            entity_id,
+            limit=self.max_rows,
+            since=None if since is None else np.datetime_as_string(since, unit="us"),
+            decode=decode_states,
+        )
+
+        if since is not None:
+            # The API may ignore `since`, only keep records we don't have yet.
+            new_history = new_history.after(since)
+
+        self.state_store.record(to_rows(entity_id, new_history))
+        if len(new_history):
+            self.synced_until_by_entity[entity_id] = new_history.created[-1]
+
+        if cached is None:
+            history = new_history
+        elif len(new_history):
+            history = cached.concat(new_history)
+        else:
+            history = cached
+
+        rollups = self.get_rollups(entity_id)
+        if since is None or rollups is None or not history.is_numeric:
+            rollups = self._build_rollups(history)
+        else:
+            # Only the delta is folded in, on a copy as plots being prepared
+            # may read the current rollups. Records already held locally, e.g.
+            # polled states, are counted already. Rebuilding is no option, the
+            # rows kept in memory may not reach back as far as the rollups.
+            delta = new_history
+            if len(delta) and len(cached):
+                fresh = ~np.isin(delta.created, cached.created)
+                delta = HistoryColumns(delta.created[fresh], delta.state[fresh])
+            rollups = copy.deepcopy(rollups)
+            rollups.extend(delta.created.view(np.int64), delta.state)
+
+        return self._put(entity_id, history, rollups)
+
+    def get_rollups(self, entity_id):
+        with self.lock:
+            return self.rollups_by_entity.get(entity_id)
+
+    def _build_rollups(self, history):
+        if not history.is_numeric:
+            return None
+
+        rollups = RollupPyramid()
+        rollups.extend(history.created.view(np.int64), history.state)
+
+        return rollups
+
+    def _put(self, entity_id, history, rollups):
+        if len(history) > self.max_memory_rows:
+            history = history.tail(self.max_memory_rows)
+
+        with self.lock:
+            self.history_by_entity[entity_id] = history
+            self.rollups_by_entity[entity_id] = rollups
+            self.history_by_entity.move_to_end(entity_id)
+
+            while len(self.history_by_entity) > self.max_entities or (
+                len(self.history_by_entity) > 1 and self._nbytes() > self.max_bytes
+            ):
+                evicted_id, _ = self.history_by_entity.popitem(last=False)
+                self.rollups_by_entity.pop(evicted_id, None)
+
+        return history
+
+    def _nbytes(self):
+        nbytes = sum(h.nbytes for h in self.history_by_entity.values())
+        nbytes += sum(r.nbytes for r in self.rollups_by_entity.values() if r)
+
+        return nbytes
+
+    def clear(self):
+        with self.lock:
+            self.history_by_entity.clear()
+            self.rollups_by_entity.clear()
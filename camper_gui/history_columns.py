@@ -0,0 +1,148 @@
+import warnings
+
+import numpy as np
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+from config import settings
+
+# Numeric states, float32 halves the memory of retained history
+STATE_DTYPE = np.float32 if settings.low_memory else np.float64
+
+
+class HistoryColumns:
+    # Entity history as typed columns: `created` is datetime64[ns] and `state`
+    # is STATE_DTYPE for numeric entities, or integer codes into `categories`.
+    def __init__(self, created, state, categories=None):
+        self.created = created
+        self.state = state
+        self.categories = categories
+
+    @property
+    def is_numeric(self):
+        return self.categories is None
+
+    def __len__(self):
+        return len(self.created)
+
+    @property
+    def nbytes(self):
+        nbytes = self.created.nbytes + self.state.nbytes
+        if self.categories is not None:
+            nbytes += self.categories.nbytes
+
+        return nbytes
+
+    def labels(self):
+        if self.is_numeric:
+            # Integral readings as the API sends them, 80 rather than 80.0
+            labels = self.state.astype(str)
+            integral = np.char.endswith(labels, ".0")
+            if np.any(integral):
+                labels[integral] = np.char.partition(labels[integral], ".")[:, 0]
+
+            return labels
+
+        return self.categories[self.state]
+
+    def after(self, stamp):
+        mask = self.created > stamp
+
+        return HistoryColumns(self.created[mask], self.state[mask], self.categories)
+
+    def tail(self, n):
+        # Copies, a view would keep the full arrays alive
+        return HistoryColumns(
+            self.created[-n:].copy(), self.state[-n:].copy(), self.categories
+        )
+
+    def concat(self, other):
+        if len(other) == 0:
+            return self
+
+        if len(self) == 0:
+            return other
+
+        created = np.concatenate([self.created, other.created])
+
+        if self.is_numeric and other.is_numeric:
+            history = HistoryColumns(created, np.concatenate([self.state, other.state]))
+        else:
+            history = _encode(created, np.concatenate([self.labels(), other.labels()]))
+
+        if np.all(other.created[:1] > self.created[-1:]):
+            return history
+
+        # Overlapping ranges, sort and keep one record per timestamp
+        _, keep = np.unique(history.created, return_index=True)
+
+        return HistoryColumns(
+            history.created[keep], history.state[keep], history.categories
+        )
+
+
+def _encode(created, labels):
+    categories, codes = np.unique(labels.astype(str), return_inverse=True)
+
+    return HistoryColumns(created, codes.astype(np.int32), categories)
+
+
+def _parse_created(created):
+    with warnings.catch_warnings():
+        # Offsets are applied, the result is naive UTC
+        warnings.simplefilter("ignore", UserWarning)
+        return np.array(created, dtype="datetime64[ns]")
+
+
+def empty_history():
+    return HistoryColumns(
+        np.empty(0, dtype="datetime64[ns]"), np.empty(0, dtype=STATE_DTYPE)
+    )
+
+
+def _build(created, states):
+    try:
+        try:
+            history = HistoryColumns(created, np.array(states, dtype=STATE_DTYPE))
+        except TypeError:
+            # None for missing readings
+            states = [np.nan if s is None else s for s in states]
+            history = HistoryColumns(created, np.array(states, dtype=STATE_DTYPE))
+    except ValueError:
+        history = _encode(created, np.array(states, dtype=object))
+
+    if np.any(history.created[1:] < history.created[:-1]):
+        order = np.argsort(history.created, kind="stable")
+        history = HistoryColumns(
+            history.created[order], history.state[order], history.categories
+        )
+
+    return history
+
+
+def decode_states(content):
+    records = json_loads(content)
+    if not records:
+        return empty_history()
+
+    created = _parse_created([r["created"] for r in records])
+
+    return _build(created, [r["state"] for r in records])
+
+
+def from_rows(created_ns, states):
+    if not created_ns:
+        return empty_history()
+
+    created = np.array(created_ns, dtype=np.int64).astype("datetime64[ns]")
+
+    return _build(created, states)
+
+
+def to_rows(entity_id, history):
+    created_ns = history.created.astype(np.int64).tolist()
+
+    return zip([entity_id] * len(history), created_ns, history.labels().tolist())
@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the histogram buckets in ms, the last one catches the rest
+BUCKET_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf"))
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKET_BOUNDS_MS)
+        self.count = 0
+        self.total_ms = 0
+        self.max_ms = 0
+
+    def add(self, value_ms):
+        for i, bound in enumerate(BUCKET_BOUNDS_MS):
+            if value_ms <= bound:
+                self.counts[i] += 1
+                break
+
+        self.count += 1
+        self.total_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def percentile(self, fraction):
+        # Upper bound of the bucket holding the percentile
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKET_BOUNDS_MS, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max_ms)
+
+        return self.max_ms
+
+
+class Metrics:
+    # Timings and gauges of the hot paths, shown on the Diagnostics tab. Safe
+    # to update from any thread.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.gauges = {}
+
+    def record(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+
+            histogram.add(seconds * 1000)
+
+    @contextmanager
+    def timer(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def add_gauge(self, name, delta):
+        with self.lock:
+            self.gauges[name] = self.gauges.get(name, 0) + delta
+
+    def snapshot(self):
+        with self.lock:
+            histograms = {
+                name: {
+                    "count": h.count,
+                    "mean": h.total_ms / h.count,
+                    "p50": h.percentile(0.5),
+                    "p95": h.percentile(0.95),
+                    "max": h.max_ms,
+                    "buckets": list(h.counts),
+                }
+                for name, h in self.histograms.items()
+            }
+
+            return histograms, dict(self.gauges)
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+
+
+def rss_bytes():
+    # Resident set size, from /proc on Linux
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+metrics = Metrics()
@@ -0,0 +1,168 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from config import settings
+
+
+def _match_query(text):
+    # Every word as a quoted prefix, so user input is never parsed as FTS syntax
+    words = text.split()
+
+    return " ".join('"' + w.replace('"', '""') + '"*' for w in words)
+
+
+class MessageLog:
+    def __init__(self, path=None):
+        self.path = os.path.expanduser(path or settings.message_log_path)
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self.lock = threading.Lock()
+        # Bumped on every change, lets views skip queries when nothing changed
+        self.version = 0
+        self.conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+
+        with self.lock:
+            self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                " id INTEGER PRIMARY KEY,"
+                " first_stamp REAL NOT NULL,"
+                " stamp REAL NOT NULL,"
+                " count INTEGER NOT NULL,"
+                " state TEXT NOT NULL,"
+                " message TEXT NOT NULL,"
+                " details TEXT"
+                ")"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS messages_state ON messages (state, id)"
+            )
+            # Full text index over message and details, kept in sync by triggers
+            self.conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS messages_text USING fts5("
+                " message, details, content='messages', content_rowid='id'"
+                ")"
+            )
+            self.conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS messages_insert AFTER INSERT ON messages"
+                " BEGIN"
+                " INSERT INTO messages_text (rowid, message, details)"
+                " VALUES (new.id, new.message, new.details);"
+                " END"
+            )
+            self.conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS messages_delete AFTER DELETE ON messages"
+                " BEGIN"
+                " INSERT INTO messages_text (messages_text, rowid, message, details)"
+                " VALUES ('delete', old.id, old.message, old.details);"
+                " END"
+            )
+            self.conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS messages_update"
+                " AFTER UPDATE OF details ON messages"
+                " BEGIN"
+                " INSERT INTO messages_text (messages_text, rowid, message, details)"
+                " VALUES ('delete', old.id, old.message, old.details);"
+                " INSERT INTO messages_text (rowid, message, details)"
+                " VALUES (new.id, new.message, new.details);"
+                " END"
+            )
+
+    def add(self, entry):
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT INTO messages"
+                " (first_stamp, stamp, count, state, message, details)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    entry["first_stamp"].timestamp(),
+                    entry["stamp"].timestamp(),
+                    entry["count"],
+                    entry["state"],
+                    entry["message"],
+                    entry["details"],
+                ),
+            )
+            self.version += 1
+
+        return cursor.lastrowid
+
+    def update(self, entry):
+        # Repeat of a logged message
+        with self.lock:
+            self.conn.execute(
+                "UPDATE messages SET stamp = ?, count = ?, details = ? WHERE id = ?",
+                (
+                    entry["stamp"].timestamp(),
+                    entry["count"],
+                    entry["details"],
+                    entry["id"],
+                ),
+            )
+            self.version += 1
+
+    def page(self, before_id=None, state=None, text=None, limit=20):
+        # Newest first, paged on id so each page is a short index range scan
+        where = []
+        params = []
+        if before_id is not None:
+            where.append("id < ?")
+            params.append(before_id)
+        if state is not None:
+            where.append("state = ?")
+            params.append(state)
+        if text:
+            where.append(
+                "id IN (SELECT rowid FROM messages_text WHERE messages_text MATCH ?)"
+            )
+            params.append(_match_query(text))
+
+        query = "SELECT id, first_stamp, stamp, count, state, message, details"
+        query += " FROM messages"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+
+        return [
+            {
+                "id": row[0],
+                "first_stamp": datetime.fromtimestamp(row[1]),
+                "stamp": datetime.fromtimestamp(row[2]),
+                "count": row[3],
+                "state": row[4],
+                "message": row[5],
+                "details": row[6],
+            }
+            for row in rows
+        ]
+
+    def rotate(self):
+        oldest = time.time() - settings.message_log_retention_days * 86400
+
+        with self.lock:
+            self.conn.execute("DELETE FROM messages WHERE stamp < ?", (oldest,))
+            self.conn.execute(
+                "DELETE FROM messages WHERE id <= ("
+                " SELECT id FROM messages ORDER BY id DESC LIMIT 1 OFFSET ?"
+                ")",
+                (settings.message_log_max_rows,),
+            )
+            self.conn.execute("PRAGMA incremental_vacuum")
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.version += 1
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,123 @@
+import numpy as np
+
+from history_columns import STATE_DTYPE
+
+NS_PER_S = 1_000_000_000
+
+# Bucket width in seconds and number of buckets kept per level
+ROLLUP_LEVELS = (
+    (60, 2 * 1440),
+    (15 * 60, 35 * 96),
+    (4 * 3600, 366 * 6),
+)
+
+
+def max_rollup_nbytes(levels=ROLLUP_LEVELS):
+    # Size of a pyramid with every level full: start, min, max, sum and count
+    bucket_nbytes = 8 + 2 * np.dtype(STATE_DTYPE).itemsize + 8 + 4
+
+    return sum(keep for _, keep in levels) * bucket_nbytes
+
+
+class Rollup:
+    # Min, max, sum and count of a numeric series per fixed-width bucket
+    def __init__(self, width_s, keep):
+        self.width = width_s * NS_PER_S
+        self.keep = keep
+
+        self.start = np.empty(0, dtype=np.int64)
+        self.min = np.empty(0, dtype=STATE_DTYPE)
+        self.max = np.empty(0, dtype=STATE_DTYPE)
+        self.sum = np.empty(0, dtype=np.float64)
+        self.count = np.empty(0, dtype=np.int32)
+
+    def extend(self, created_ns, values):
+        # created_ns must be sorted, samples older than the last bucket are
+        # ignored
+        valid = ~np.isnan(values)
+        if len(self.start):
+            valid &= created_ns >= self.start[-1]
+
+        created_ns = created_ns[valid]
+        values = values[valid]
+        if len(values) == 0:
+            return
+
+        buckets = created_ns // self.width * self.width
+        first = np.flatnonzero(np.concatenate([[True], buckets[1:] != buckets[:-1]]))
+
+        start = buckets[first]
+        b_min = np.minimum.reduceat(values, first)
+        b_max = np.maximum.reduceat(values, first)
+        b_sum = np.add.reduceat(values.astype(np.float64), first)
+        b_count = np.diff(np.append(first, len(values))).astype(np.int32)
+
+        if len(self.start) and start[0] == self.start[-1]:
+            # Samples for the bucket that is still filling up
+            self.min[-1] = min(self.min[-1], b_min[0])
+            self.max[-1] = max(self.max[-1], b_max[0])
+            self.sum[-1] += b_sum[0]
+            self.count[-1] += b_count[0]
+
+            start, b_min, b_max = start[1:], b_min[1:], b_max[1:]
+            b_sum, b_count = b_sum[1:], b_count[1:]
+
+        self.start = np.concatenate([self.start, start])[-self.keep :]
+        self.min = np.concatenate([self.min, b_min])[-self.keep :]
+        self.max = np.concatenate([self.max, b_max])[-self.keep :]
+        self.sum = np.concatenate([self.sum, b_sum])[-self.keep :]
+        self.count = np.concatenate([self.count, b_count])[-self.keep :]
+
+    @property
+    def nbytes(self):
+        return (
+            self.start.nbytes
+            + self.min.nbytes
+            + self.max.nbytes
+            + self.sum.nbytes
+            + self.count.nbytes
+        )
+
+    def covers(self, lo):
+        return len(self.start) > 0 and self.start[0] <= lo
+
+    def window(self, lo, hi):
+        i = np.searchsorted(self.start, lo - self.width, side="right")
+        j = np.searchsorted(self.start, hi, side="right")
+
+        return (
+            self.start[i:j],
+            self.sum[i:j] / self.count[i:j],
+            self.min[i:j],
+            self.max[i:j],
+        )
+
+
+class RollupPyramid:
+    def __init__(self, levels=ROLLUP_LEVELS):
+        self.levels = [Rollup(width_s, keep) for width_s, keep in levels]
+        self.first_ns = None
+
+    @property
+    def nbytes(self):
+        return sum(level.nbytes for level in self.levels)
+
+    def extend(self, created_ns, values):
+        if len(created_ns) and self.first_ns is None:
+            self.first_ns = created_ns[0]
+
+        for level in self.levels:
+            level.extend(created_ns, values)
+
+    def select(self, lo, hi, max_points):
+        # Finest level that spans the window in at most max_points buckets and
+        # still holds data back to lo (or the first sample), otherwise the
+        # coarsest one.
+        if self.first_ns is not None:
+            lo_data = max(lo, self.first_ns)
+
+            for level in self.levels:
+                if (hi - lo) / level.width <= max_points and level.covers(lo_data):
+                    return level.window(lo, hi)
+
+        return self.levels[-1].window(lo, hi)
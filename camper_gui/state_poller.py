@@ -0,0 +1,347 @@
+import sqlite3
+import threading
+import time
+
+from api_client import ApiException, ApiOffline
+from config import settings
+from state_store import stamp_to_ns
+
+# Shortest wait between scheduler wake-ups, e.g. while a due poll is in flight
+MIN_DELAY_MS = 200
+
+
+class StatePoller:
+    def __init__(
+        self,
+        master,
+        statusbar,
+        ui_queue,
+        api_client,
+        state_store,
+        api_sensors,
+        executor,
+        tab_name="Status",
+    ):
+        self.master = master
+        self.statusbar = statusbar
+        self.ui_queue = ui_queue
+        self.api_client = api_client
+        self.state_store = state_store
+        self.executor = executor
+        self.tab_name = tab_name
+
+        self.subscriptions = []
+        self.set_sensors(api_sensors)
+
+        # Per sensor schedule in time.monotonic() seconds. Intervals are in ms,
+        # they stretch while a sensor's states stay the same and drop to
+        # poll_boost_interval_ms for a while after a user action.
+        self.lock = threading.Lock()
+        self.polling_sensors = set()
+        self.next_poll_by_sensor = {}
+        self.interval_by_sensor = {}
+        self.boost_until_by_sensor = {}
+        self.last_states_by_sensor = {}
+        self.runner_id = None
+        # Set while a StateStream delivers changes, polls are then only a
+        # consistency check
+        self.streaming = False
+
+    def set_sensors(self, api_sensors):
+        sensor_by_name = {}
+        sensor_entity_by_id = {}
+        for sensor in api_sensors:
+            sensor_by_name[sensor["name"]] = {
+                "id": sensor["id"],
+                "entity_id_by_name": {e["name"]: e["id"] for e in sensor["entities"]},
+            }
+            for e in sensor["entities"]:
+                sensor_entity_by_id[e["id"]] = (sensor["name"], e["name"])
+
+        self.sensor_by_name = sensor_by_name
+        self.sensor_entity_by_id = sensor_entity_by_id
+
+    def get_entity_id(self, sensor_name, entity_name):
+        sensor = self.sensor_by_name.get(sensor_name)
+        if sensor is None:
+            return None
+
+        return sensor["entity_id_by_name"].get(entity_name)
+
+    def subscribe(self, callback, sensor_name, entity_names, prefix=""):
+        self.subscriptions.append(
+            {
+                "callback": callback,
+                "sensor_name": sensor_name,
+                "entity_names": list(entity_names),
+                "prefix": prefix,
+            }
+        )
+
+    def start(self):
+        # Last known states from the store fill the frames until the first
+        # poll returns.
+        self._publish(self._stored_states())
+        self.poll_runner()
+
+    def _stored_states(self):
+        try:
+            sensor_states = {}
+            for sensor_name in self._sensor_names():
+                sensor = self.sensor_by_name.get(sensor_name)
+                if sensor is None:
+                    continue
+
+                entity_id_by_name = sensor["entity_id_by_name"]
+                state_by_id = self.state_store.latest_states(entity_id_by_name.values())
+                sensor_states[sensor_name] = {
+                    entity_name: state_by_id[entity_id]
+                    for entity_name, entity_id in entity_id_by_name.items()
+                    if entity_id in state_by_id
+                }
+
+            return sensor_states
+        except sqlite3.Error as ex:
+            self.statusbar.add_message(
+                f"Could not read stored states: {ex.__class__.__name__}",
+                state="warning",
+                details=str(ex),
+            )
+
+        return {}
+
+    def poll_runner(self):
+        current_tab = self.master.tabview.get()
+
+        if current_tab == self.tab_name:
+            now = time.monotonic()
+            self.submit_poll(
+                [
+                    sensor_name
+                    for sensor_name in self._sensor_names()
+                    if self.next_poll_by_sensor.get(sensor_name, 0) <= now
+                ]
+            )
+            delay_ms = self._next_delay_ms(now)
+        else:
+            self._publish({})
+            delay_ms = settings.poll_interval_ms
+
+        self.runner_id = self.master.after(delay_ms, self.poll_runner)
+
+    def _next_delay_ms(self, now):
+        next_poll = min(self.next_poll_by_sensor.values(), default=None)
+        if next_poll is None:
+            return settings.poll_interval_ms
+
+        return max(int((next_poll - now) * 1000), MIN_DELAY_MS)
+
+    def _base_interval_ms(self, sensor_name):
+        return settings.poll_intervals_ms.get(sensor_name, settings.poll_interval_ms)
+
+    def _interval_ms(self, sensor_name, now):
+        with self.lock:
+            interval = self.interval_by_sensor.get(
+                sensor_name, self._base_interval_ms(sensor_name)
+            )
+
+            if self.streaming:
+                interval = max(interval, settings.poll_stream_interval_ms)
+
+            if self.boost_until_by_sensor.get(sensor_name, 0) > now:
+                interval = min(interval, settings.poll_boost_interval_ms)
+
+        return interval
+
+    def set_streaming(self, streaming):
+        with self.lock:
+            self.streaming = streaming
+
+    def handle_states(self, api_states):
+        # State changes pushed by the StateStream, called from its thread
+        self._record(api_states)
+
+        states_by_sensor = {}
+        for s in api_states:
+            sensor_entity = self.sensor_entity_by_id.get(s["entity_id"])
+            if sensor_entity is None:
+                continue
+
+            sensor_name, entity_name = sensor_entity
+            states_by_sensor.setdefault(sensor_name, {})[entity_name] = s["state"]
+
+        if states_by_sensor:
+            self._publish(states_by_sensor, list(states_by_sensor))
+
+    def boost(self, sensor_name):
+        # Poll a sensor right away and at a fast rate for a while, used after
+        # user actions. Runs on the main thread.
+        now = time.monotonic()
+        with self.lock:
+            self.boost_until_by_sensor[sensor_name] = (
+                now + settings.poll_boost_duration_ms / 1000
+            )
+        self.next_poll_by_sensor[sensor_name] = now
+
+        if self.runner_id is not None:
+            self.master.after_cancel(self.runner_id)
+        self.poll_runner()
+
+    def submit_poll(self, sensor_names=None):
+        if sensor_names is None:
+            sensor_names = self._sensor_names()
+
+        # Skip sensors with a request still in flight, otherwise a late
+        # response could overwrite newer states.
+        with self.lock:
+            sensor_names = [
+                sensor_name
+                for sensor_name in sensor_names
+                if sensor_name not in self.polling_sensors
+            ]
+            self.polling_sensors.update(sensor_names)
+        if not sensor_names:
+            return
+
+        # Next poll is due one interval after the previous due time, so the
+        # schedule does not drift with the time spent here. Missed ticks are
+        # dropped instead of being caught up.
+        now = time.monotonic()
+        for sensor_name in sensor_names:
+            interval = self._interval_ms(sensor_name, now) / 1000
+            next_poll = self.next_poll_by_sensor.get(sensor_name, now) + interval
+            if next_poll <= now:
+                next_poll = now + interval
+            self.next_poll_by_sensor[sensor_name] = next_poll
+
+        future = self.executor.submit(
+            self.poll, sensor_names, key=("poll", tuple(sensor_names))
+        )
+
+        def dropped(future):
+            # A poll dropped from a full task queue never runs
+            if future.cancelled():
+                self._end_poll(sensor_names)
+
+        future.add_done_callback(dropped)
+
+    def _sensor_names(self):
+        sensor_names = []
+        for subscription in self.subscriptions:
+            if subscription["sensor_name"] not in sensor_names:
+                sensor_names.append(subscription["sensor_name"])
+
+        return sensor_names
+
+    def _fetch_sensor(self, sensor_name):
+        try:
+            sensor = self.sensor_by_name.get(sensor_name)
+            if sensor is None:
+                raise ApiException(f"sensor_id for `{sensor_name}` not set")
+
+            api_states = self.api_client.get_sensor_states(sensor["id"])
+            state_by_id = {s["entity_id"]: s["state"] for s in api_states}
+            self._record(api_states)
+
+            sensor_states = {
+                entity_name: state_by_id[entity_id]
+                for entity_name, entity_id in sensor["entity_id_by_name"].items()
+                if entity_id in state_by_id
+            }
+            self._adapt_interval(sensor_name, sensor_states)
+
+            return sensor_states
+        except ApiOffline:
+            # Reported once by the App when the API goes offline
+            pass
+        except ApiException as ex:
+            self.statusbar.add_message(
+                f"Could not retrieve status from API: {ex.__class__.__name__}",
+                details=str(ex),
+            )
+        except Exception as ex:
+            self.statusbar.add_message(
+                f"General exception: {ex.__class__.__name__}",
+                details=str(ex),
+            )
+
+        return None
+
+    def _adapt_interval(self, sensor_name, sensor_states):
+        base = self._base_interval_ms(sensor_name)
+
+        with self.lock:
+            if self.last_states_by_sensor.get(sensor_name) == sensor_states:
+                interval = self.interval_by_sensor.get(sensor_name, base)
+                interval = min(
+                    interval * settings.poll_stable_factor,
+                    base * settings.poll_stable_max_factor,
+                )
+            else:
+                interval = base
+
+            self.interval_by_sensor[sensor_name] = interval
+            self.last_states_by_sensor[sensor_name] = sensor_states
+
+    def _record(self, api_states):
+        try:
+            self.state_store.record(
+                (s["entity_id"], stamp_to_ns(s.get("created")), s["state"])
+                for s in api_states
+            )
+        except (sqlite3.Error, ValueError) as ex:
+            self.statusbar.add_message(
+                f"Could not store states: {ex.__class__.__name__}",
+                state="warning",
+                details=str(ex),
+            )
+
+    def poll(self, sensor_names):
+        # Each sensor is published as soon as its own response is in, a slow
+        # sensor does not hold back the others.
+        remaining = set(sensor_names)
+        try:
+            for sensor_name, sensor_states in self.executor.fetch_each(
+                self._fetch_sensor, sensor_names
+            ):
+                self._publish({sensor_name: sensor_states}, [sensor_name])
+                self._end_poll([sensor_name])
+                remaining.discard(sensor_name)
+        finally:
+            self._end_poll(remaining)
+
+    def _end_poll(self, sensor_names):
+        with self.lock:
+            self.polling_sensors.difference_update(sensor_names)
+
+    def _publish(self, states_by_sensor, sensor_names=None):
+        # Only subscriptions to sensor_names, all when None, are updated.
+        # Sensors missing from states_by_sensor, or that failed to fetch, reset
+        # their subscribed entities to None so frames grey them out. States are
+        # merged per callback so a frame fed by several sensors renders once.
+        states_by_callback = {}
+        for subscription in self.subscriptions:
+            sensor_name = subscription["sensor_name"]
+            if sensor_names is not None and sensor_name not in sensor_names:
+                continue
+
+            sensor_states = states_by_sensor.get(sensor_name)
+            sensor = self.sensor_by_name.get(sensor_name)
+
+            states = {}
+            for entity_name in subscription["entity_names"]:
+                key = f"{subscription['prefix']}{entity_name}"
+
+                if sensor_states is not None:
+                    if entity_name in sensor_states:
+                        states[key] = sensor_states[entity_name]
+                elif sensor is None or entity_name in sensor["entity_id_by_name"]:
+                    states[key] = None
+
+            callback = subscription["callback"]
+            states_by_callback.setdefault(callback, {}).update(states)
+
+        # Merged into a pending update of the same frame, stream deltas and
+        # poll results of other sensors must not replace each other.
+        for callback, states in states_by_callback.items():
+            self.ui_queue.merge(callback, states, key=("states", callback))
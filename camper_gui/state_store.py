@@ -0,0 +1,130 @@
+import calendar
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from config import settings
+
+
+def stamp_to_ns(stamp):
+    # API timestamps are ISO 8601, naive ones are taken as UTC
+    if stamp is None:
+        return time.time_ns()
+
+    created = datetime.fromisoformat(stamp)
+    if created.tzinfo is not None:
+        created = created.astimezone(timezone.utc)
+
+    seconds = calendar.timegm(created.utctimetuple())
+
+    return seconds * 1_000_000_000 + created.microsecond * 1000
+
+
+class StateStore:
+    def __init__(self, path=None):
+        self.path = os.path.expanduser(path or settings.state_store_path)
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+
+        with self.lock:
+            # auto_vacuum only takes effect before the first table is created
+            self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS states ("
+                " entity_id INTEGER NOT NULL,"
+                " created INTEGER NOT NULL,"
+                " state TEXT,"
+                " PRIMARY KEY (entity_id, created)"
+                ") WITHOUT ROWID"
+            )
+            # Last sensor catalogue from the API, as a single JSON document
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS catalogue ("
+                " id INTEGER PRIMARY KEY CHECK (id = 0),"
+                " sensors TEXT NOT NULL"
+                ")"
+            )
+
+    def record(self, rows):
+        # rows are (entity_id, created_ns, state), already stored rows are kept
+        rows = [
+            (entity_id, created, None if state is None else str(state))
+            for entity_id, created, state in rows
+        ]
+        if not rows:
+            return
+
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO states (entity_id, created, state)"
+                " VALUES (?, ?, ?)",
+                rows,
+            )
+
+    def read(self, entity_id, limit):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT created, state FROM states WHERE entity_id = ?"
+                " ORDER BY created DESC LIMIT ?",
+                (entity_id, limit),
+            ).fetchall()
+
+        rows.reverse()
+
+        return [r[0] for r in rows], [r[1] for r in rows]
+
+    def latest_states(self, entity_ids):
+        states = {}
+
+        with self.lock:
+            for entity_id in entity_ids:
+                row = self.conn.execute(
+                    "SELECT state FROM states WHERE entity_id = ?"
+                    " ORDER BY created DESC LIMIT 1",
+                    (entity_id,),
+                ).fetchone()
+
+                if row is not None:
+                    states[entity_id] = row[0]
+
+        return states
+
+    def read_catalogue(self):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT sensors FROM catalogue WHERE id = 0"
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return json.loads(row[0])
+
+    def write_catalogue(self, api_sensors):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO catalogue (id, sensors) VALUES (0, ?)",
+                (json.dumps(api_sensors),),
+            )
+
+    def compact(self):
+        oldest = time.time_ns() - settings.state_store_retention_days * 86400 * 10**9
+
+        with self.lock:
+            self.conn.execute("DELETE FROM states WHERE created < ?", (oldest,))
+            self.conn.execute("PRAGMA incremental_vacuum")
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,59 @@
+import random
+import threading
+
+from api_client import ApiException, ApiStreamUnsupported
+from config import settings
+
+
+class StateStream:
+    # Holds the server-sent event stream of state changes on its own thread
+    # and feeds them to the poller. Polling keeps running as fallback, at a
+    # slower rate while the stream is connected.
+    def __init__(self, statusbar, api_client, poller):
+        self.statusbar = statusbar
+        self.api_client = api_client
+        self.poller = poller
+
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name="state-stream", daemon=True
+        )
+
+    def start(self):
+        if settings.api_stream:
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        delay = settings.api_breaker_backoff
+
+        while not self.stop_event.is_set():
+            try:
+                for api_states in self.api_client.stream_states():
+                    if not self.poller.streaming:
+                        self.poller.set_streaming(True)
+                        delay = settings.api_breaker_backoff
+
+                    if api_states:
+                        self.poller.handle_states(api_states)
+
+                    if self.stop_event.is_set():
+                        break
+            except ApiStreamUnsupported as ex:
+                self.poller.set_streaming(False)
+                self.statusbar.add_message(
+                    "Live updates not supported by the API, polling instead",
+                    state="info",
+                    details=str(ex),
+                )
+                return
+            except ApiException:
+                # Reconnected below, the poller reports the API being offline
+                pass
+
+            self.poller.set_streaming(False)
+
+            self.stop_event.wait(delay / 2 + random.uniform(0, delay / 2))
+            delay = min(delay * 2, settings.api_breaker_max_backoff)
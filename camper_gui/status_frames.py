@@ -1,19 +1,32 @@
 import customtkinter
+import sqlite3
 import subprocess
+import threading
+import traceback
+from collections import deque
 from datetime import datetime
 
+from frame_base import FrameBase
+
 MAX_MESSAGES = 14
+# Rows shown per page of the Messages tab
+PAGE_ROWS = 12
+SEVERITIES = ("all", "error", "warning", "info")
 
 
 class StatusBarFrame(customtkinter.CTkFrame):
-    def __init__(self, master):
+    def __init__(self, master, ui_queue, message_log):
         super().__init__(master)
+        self.ui_queue = ui_queue
+        self.message_log = message_log
+        self.lock = threading.Lock()
         self.grid_columnconfigure(0, weight=11)
         self.grid_columnconfigure(1, weight=1)
         self.grid_columnconfigure(2, weight=1)
         self.grid_rowconfigure(0, weight=1)
 
-        self.message_list = []
+        # Newest first, repeats of a message are merged into one entry
+        self.message_list = deque(maxlen=MAX_MESSAGES)
 
         self.message_text = customtkinter.CTkLabel(
             self,
@@ -71,20 +84,54 @@ class StatusBarFrame(customtkinter.CTkFrame):
             print(f"Error: {e}")
 
     def add_message(self, message, state="error", details=None):
-        self.message_list.insert(
-            0,
-            {
-                "stamp": datetime.now(),
-                "message": message,
-                "state": state,
-                "details": details,
-            },
-        )
+        # Called from worker threads, the label is updated on the next UI tick.
+        stamp = datetime.now()
+
+        with self.lock:
+            entry = None
+            for m in self.message_list:
+                if m["message"] == message and m["state"] == state:
+                    entry = m
+                    break
+
+            top_changed = not self.message_list or self.message_list[0] is not entry
+
+            if entry is None:
+                entry = {
+                    "stamp": stamp,
+                    "first_stamp": stamp,
+                    "count": 1,
+                    "message": message,
+                    "state": state,
+                    "details": details,
+                }
+            else:
+                self.message_list.remove(entry)
+                entry["stamp"] = stamp
+                entry["count"] += 1
+                entry["details"] = details
 
-        if len(self.message_list) > MAX_MESSAGES:
-            self.message_list = self.message_list[0:10]
+            self.message_list.appendleft(entry)
 
-        active_message = self.message_list[0]
+            try:
+                if entry["count"] == 1:
+                    entry["id"] = self.message_log.add(entry)
+                elif "id" in entry:
+                    self.message_log.update(entry)
+            except sqlite3.Error:
+                traceback.print_exc()
+
+        # A repeat of the message on top leaves the label as it is
+        if top_changed:
+            self.ui_queue.post(self.update_message_text, key=("message_text", self))
+
+    def get_messages(self):
+        with self.lock:
+            return [dict(m) for m in self.message_list]
+
+    def update_message_text(self):
+        with self.lock:
+            active_message = self.message_list[0]
 
         if active_message["state"] == "info":
             message_color = "green"
@@ -99,21 +146,58 @@ class StatusBarFrame(customtkinter.CTkFrame):
         )
 
 
-class StatusMessagesFrame(customtkinter.CTkFrame):
-    def __init__(self, master, statusbar, exceutor):
+class StatusMessagesFrame(FrameBase):
+    def __init__(self, master, statusbar, ui_queue, message_log, exceutor):
         super().__init__(master)
         self.statusbar = statusbar
+        self.ui_queue = ui_queue
+        self.message_log = message_log
         self.executor = exceutor
 
         self.grid_columnconfigure(0, weight=1)
         self.grid_columnconfigure(1, weight=7)
 
+        # Page currently shown: the id to page before, None for the newest
+        # messages, and the ids of the pages before it for paging back.
+        self.before_id = None
+        self.newer_pages = []
+        self.requested_query = None
+        self.rendered_version = None
+        self.search_id = None
+
+        self.filter_frame = customtkinter.CTkFrame(self, fg_color="transparent")
+        self.filter_frame.grid(
+            row=0, column=0, padx=10, pady=2, sticky="ew", columnspan=2
+        )
+        self.filter_frame.grid_columnconfigure(1, weight=1)
+
+        self.severity_button = customtkinter.CTkSegmentedButton(
+            self.filter_frame, values=list(SEVERITIES), command=self._filter_callback
+        )
+        self.severity_button.set("all")
+        self.severity_button.grid(row=0, column=0, padx=(0, 10), sticky="w")
+
+        self.search_entry = customtkinter.CTkEntry(
+            self.filter_frame, placeholder_text="Search"
+        )
+        self.search_entry.bind("<KeyRelease>", self._search_callback)
+        self.search_entry.grid(row=0, column=1, padx=(0, 10), sticky="ew")
+
+        self.newer_button = customtkinter.CTkButton(
+            self.filter_frame, text="Newer", width=70, command=self._newer_callback
+        )
+        self.newer_button.grid(row=0, column=2, padx=2)
+        self.older_button = customtkinter.CTkButton(
+            self.filter_frame, text="Older", width=70, command=self._older_callback
+        )
+        self.older_button.grid(row=0, column=3, padx=2)
+
         self.stamp_labels = []
         self.messages = []
-        self.states = []
+        self.page_rows = []
 
-        for i in range(0, MAX_MESSAGES):
-            self.grid_rowconfigure(i, weight=1)
+        for i in range(0, PAGE_ROWS):
+            self.grid_rowconfigure(i + 1, weight=1)
             self.stamp_labels.append(
                 customtkinter.CTkLabel(
                     self,
@@ -124,7 +208,9 @@ class StatusMessagesFrame(customtkinter.CTkFrame):
                     text="",
                 ),
             )
-            self.stamp_labels[i].grid(row=i, column=0, padx=10, pady=2, sticky="nesw")
+            self.stamp_labels[i].grid(
+                row=i + 1, column=0, padx=10, pady=2, sticky="nesw"
+            )
 
             self.messages.append(
                 customtkinter.CTkLabel(
@@ -136,41 +222,127 @@ class StatusMessagesFrame(customtkinter.CTkFrame):
                     text="",
                 ),
             )
-            self.messages[i].grid(row=i, column=1, padx=10, pady=2, sticky="nesw")
+            self.messages[i].grid(row=i + 1, column=1, padx=10, pady=2, sticky="nesw")
 
         self.update_messages_runner()
 
     def update_messages_runner(self):
         current_tab = self.master.master.get()
 
-        if current_tab == "Messages":
-            self.executor.submit(self.update_messages)
+        # Only the newest page follows new messages, and only when the log
+        # changed since it was rendered.
+        if (
+            current_tab == "Messages"
+            and self.before_id is None
+            and self.message_log.version != self.rendered_version
+        ):
+            self.update_messages()
 
         self.after(5000, self.update_messages_runner)
 
+    def _filter_callback(self, value):
+        self._first_page()
+
+    def _search_callback(self, event):
+        # Query once typing pauses
+        if self.search_id is not None:
+            self.after_cancel(self.search_id)
+        self.search_id = self.after(300, self._first_page)
+
+    def _first_page(self):
+        self.search_id = None
+        self.before_id = None
+        self.newer_pages = []
+        self.update_messages()
+
+    def _older_callback(self):
+        if len(self.page_rows) < PAGE_ROWS:
+            return
+
+        self.newer_pages.append(self.before_id)
+        self.before_id = self.page_rows[-1]["id"]
+        self.update_messages()
+
+    def _newer_callback(self):
+        if not self.newer_pages:
+            return
+
+        self.before_id = self.newer_pages.pop()
+        self.update_messages()
+
     def update_messages(self):
-        for i in range(0, MAX_MESSAGES):
-            if len(self.statusbar.message_list) > i:
-                if self.statusbar.message_list[i]["state"] == "info":
+        severity = self.severity_button.get()
+        query = (
+            self.before_id,
+            None if severity == "all" else severity,
+            self.search_entry.get().strip(),
+        )
+
+        self.requested_query = query
+        self.executor.submit(self._load_page, query, key=("messages", self))
+
+    def _load_page(self, query):
+        version = self.message_log.version
+        before_id, state, text = query
+
+        try:
+            rows = self.message_log.page(before_id, state, text, limit=PAGE_ROWS)
+        except sqlite3.Error as ex:
+            rows = []
+            self.statusbar.add_message(
+                f"Could not read messages: {ex.__class__.__name__}",
+                state="warning",
+                details=str(ex),
+            )
+
+        self.ui_queue.post(
+            self.render_page, query, version, rows, key=("messages", self)
+        )
+
+    def render_page(self, query, version, rows):
+        if query != self.requested_query:
+            return
+
+        self.page_rows = rows
+        self.rendered_version = version
+
+        for i in range(0, PAGE_ROWS):
+            if len(rows) > i:
+                if rows[i]["state"] == "info":
                     message_color = "green"
-                elif self.statusbar.message_list[i]["state"] == "warning":
+                elif rows[i]["state"] == "warning":
                     message_color = "orange"
                 else:
                     message_color = "red"
 
-                stamp_str = self.statusbar.message_list[i]["stamp"].strftime(
-                    "%Y-%m-%d %H:%M:%S"
-                )
-                text_str = self.statusbar.message_list[i]["message"]
+                stamp_str = rows[i]["first_stamp"].strftime("%Y-%m-%d %H:%M:%S")
+                text_str = rows[i]["message"]
+                if rows[i]["count"] > 1:
+                    text_str += (
+                        f" ({rows[i]['count']}x, last"
+                        f" {rows[i]['stamp'].strftime('%Y-%m-%d %H:%M:%S')})"
+                    )
             else:
                 message_color = "transparent"
                 stamp_str = ""
                 text_str = ""
 
-            self.stamp_labels[i].configure(text=stamp_str, fg_color=message_color)
-            self.messages[i].configure(text=text_str, fg_color=message_color)
+            self._configure(
+                self.stamp_labels[i], text=stamp_str, fg_color=message_color
+            )
+            self._configure(self.messages[i], text=text_str, fg_color=message_color)
 
-        if len(self.statusbar.message_list) == 0:
-            self.messages[0].configure(
-                text="Currently there are no messages", fg_color="transparent"
+        if len(rows) == 0:
+            self._configure(
+                self.messages[0],
+                text="Currently there are no messages",
+                fg_color="transparent",
             )
+
+        self._configure(
+            self.newer_button, state="normal" if self.newer_pages else "disabled"
+        )
+        self._configure(
+            self.older_button,
+            state="normal" if len(rows) == PAGE_ROWS else "disabled",
+        )
@@ -0,0 +1,61 @@
+import threading
+import time
+import traceback
+
+from config import settings
+from instrumentation import metrics
+
+
+class UiQueue:
+    def __init__(self, master):
+        self.master = master
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.counter = 0
+
+    def post(self, fn, *args, key=None):
+        # Safe to call from any thread. Updates posted with the same key
+        # before the next tick replace each other, so only the newest runs.
+        with self.lock:
+            if key is None:
+                key = ("unkeyed", self.counter)
+                self.counter += 1
+            else:
+                self.pending.pop(key, None)
+
+            self.pending[key] = (fn, args)
+
+    def merge(self, fn, updates, key):
+        # Like post() for a callback taking one dict, but a pending update with
+        # the same key is merged into instead of replaced, newer values win.
+        # Partial updates, e.g. streamed state changes, are then not lost.
+        with self.lock:
+            pending = self.pending.pop(key, None)
+            if pending is not None:
+                updates = {**pending[1][0], **updates}
+
+            self.pending[key] = (fn, (updates,))
+
+    def start(self):
+        self._drain_runner()
+
+    def _drain_runner(self):
+        self.drain()
+        self.master.after(settings.ui_tick_ms, self._drain_runner)
+
+    def drain(self):
+        with self.lock:
+            pending = self.pending
+            self.pending = {}
+
+        metrics.set_gauge("ui queue depth", len(pending))
+
+        for fn, args in pending.values():
+            started = time.perf_counter()
+            try:
+                fn(*args)
+            except Exception:
+                traceback.print_exc()
+            metrics.record(
+                f"ui {getattr(fn, '__qualname__', fn)}", time.perf_counter() - started
+            )
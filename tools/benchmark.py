@@ -0,0 +1,362 @@
+# Benchmarks the GUI against tools/mock_api.py.
+#
+#   python tools/benchmark.py --latency 0.02 --failure-rate 0.05 --json run.json
+#   python tools/benchmark.py --baseline run.json
+#
+# Reports poll cycle latency, History fetch/decode/prepare/render times at
+# 1k, 10k and 100k rows and Tk main loop lag. The frames need a display: when
+# DISPLAY is not set an Xvfb is started if installed, otherwise only the parts
+# without widgets run. With --baseline the run fails when a median is more
+# than --tolerance slower than in the baseline.
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import mock_api
+from tool_common import MessageCounter
+
+HISTORY_ROWS = (1000, 10000, 100000)
+
+
+def summarize(samples_s):
+    samples = np.array(samples_s) * 1000
+
+    return {
+        "n": len(samples),
+        "p50": round(float(np.percentile(samples, 50)), 2),
+        "p95": round(float(np.percentile(samples, 95)), 2),
+        "max": round(float(samples.max()), 2),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+
+    return time.perf_counter() - started, result
+
+
+def start_display():
+    if os.environ.get("DISPLAY"):
+        return None, True
+
+    if shutil.which("Xvfb") is None:
+        return None, False
+
+    display = ":97"
+    xvfb = subprocess.Popen(
+        ["Xvfb", display, "-screen", "0", "1024x600x24"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    os.environ["DISPLAY"] = display
+    time.sleep(1)
+
+    return xvfb, True
+
+
+class Bench:
+    def __init__(self, options, has_display):
+        # Imported after the environment is set up, settings are read on import
+        from api_client import ApiClient
+        from fetch_engine import FetchEngine
+        from message_log import MessageLog
+        from state_poller import StatePoller
+        from state_store import StateStore
+        from ui_queue import UiQueue
+
+        self.options = options
+        self.results = {}
+        self.root = None
+        self.tabview = None
+
+        if has_display:
+            import customtkinter
+
+            self.root = customtkinter.CTk()
+            self.root.geometry("1024x600")
+            self.tabview = customtkinter.CTkTabview(self.root)
+            for tab in ("Status", "History", "Messages"):
+                self.tabview.add(tab)
+            self.tabview.pack(fill="both", expand=True)
+            self.root.tabview = self.tabview
+
+        self.ui_queue = UiQueue(self.root)
+        self.message_log = MessageLog()
+        self.api_client = ApiClient()
+        self.state_store = StateStore()
+        self.executor = FetchEngine()
+        self.api_sensors = self.api_client.get_sensors()
+
+        if has_display:
+            from status_frames import StatusBarFrame
+
+            self.statusbar = StatusBarFrame(self.root, self.ui_queue, self.message_log)
+        else:
+            self.statusbar = MessageCounter()
+
+        self.poller = StatePoller(
+            self.root,
+            self.statusbar,
+            self.ui_queue,
+            self.api_client,
+            self.state_store,
+            self.api_sensors,
+            self.executor,
+        )
+
+    def build_frames(self):
+        from camper_interface_frame import CamperInterfaceFrame
+        from graph_frame import GraphFrame
+        from power_frame import PowerFrame
+        from temperature_frame import TemperatureFrame
+
+        status_tab = self.tabview.tab("Status")
+        self.frames = [
+            CamperInterfaceFrame(
+                status_tab,
+                self.statusbar,
+                self.ui_queue,
+                self.api_client,
+                self.poller,
+                self.executor,
+            ),
+            PowerFrame(status_tab, self.statusbar, self.poller, self.executor),
+            TemperatureFrame(status_tab, self.statusbar, self.poller, self.executor),
+        ]
+        for column, frame in enumerate(self.frames):
+            frame.grid(row=0, column=column, sticky="nsew")
+
+        self.graph_frame = GraphFrame(
+            self.tabview.tab("History"),
+            self.statusbar,
+            self.ui_queue,
+            self.api_client,
+            self.state_store,
+            self.api_sensors,
+            self.executor,
+        )
+        self.graph_frame.pack(fill="both", expand=True)
+        self.root.update()
+
+    def subscribe_all(self):
+        # Without frames every sensor gets a callback that only takes states
+        for sensor in self.api_sensors:
+            self.poller.subscribe(
+                lambda states: None,
+                sensor["name"],
+                [e["name"] for e in sensor["entities"]],
+            )
+
+    def bench_poll(self):
+        sensor_names = self.poller._sensor_names()
+        poll_samples = []
+        apply_samples = []
+
+        for _ in range(self.options.cycles):
+            poll_s, _ = timed(self.poller.poll, sensor_names)
+            apply_s, _ = timed(self.ui_queue.drain)
+            if self.root is not None:
+                apply_s += timed(self.root.update_idletasks)[0]
+
+            poll_samples.append(poll_s)
+            apply_samples.append(apply_s)
+
+        self.results["poll_cycle"] = summarize(poll_samples)
+        self.results["poll_apply_ui"] = summarize(apply_samples)
+
+    def bench_history(self):
+        from history_columns import decode_states
+
+        entity = next(
+            e
+            for sensor in self.api_sensors
+            if sensor["name"] == "SmartSolar"
+            for e in sensor["entities"]
+            if e["name"] == "solar_power"
+        )
+
+        for rows in HISTORY_ROWS:
+            fetch_samples = []
+            decode_samples = []
+            prepare_samples = []
+            render_samples = []
+
+            for _ in range(self.options.repeat):
+                fetch_s, content = timed(
+                    self.api_client.get_entity_states,
+                    entity["id"],
+                    limit=rows,
+                    decode=lambda content: content,
+                )
+                decode_s, history = timed(decode_states, content)
+                fetch_samples.append(fetch_s)
+                decode_samples.append(decode_s)
+
+                if self.root is None:
+                    continue
+
+                prepare_s, render_s = self._plot(entity, history, rows)
+                prepare_samples.append(prepare_s)
+                render_samples.append(render_s)
+
+            self.results[f"history_{rows}_fetch"] = summarize(fetch_samples)
+            self.results[f"history_{rows}_decode"] = summarize(decode_samples)
+            if prepare_samples:
+                self.results[f"history_{rows}_prepare"] = summarize(prepare_samples)
+                self.results[f"history_{rows}_render"] = summarize(render_samples)
+
+    def _plot(self, entity, history, rows):
+        graph_frame = self.graph_frame
+        name = f"SmartSolar_{entity['name']}"
+        plot_entity = graph_frame.entity_id_by_name[name]
+
+        # Window over all rows, rollups as the History tab would have them
+        graph_frame.view_span_ns = (rows + 1) * mock_api.HISTORY_STEP_S * 10**9
+        graph_frame.view_end_ns = None
+        view = graph_frame._view_window()
+        cache = graph_frame.history_cache
+        cache._put(entity["id"], history, cache._build_rollups(history))
+
+        prepare_s, plot_data = timed(
+            graph_frame._prepare_plot, plot_entity, history, view
+        )
+
+        graph_frame.requested_plot = ((name,), view)
+        started = time.perf_counter()
+        graph_frame.render_plot((name,), view, plot_entity, plot_data)
+        self.root.update()
+
+        return prepare_s, time.perf_counter() - started
+
+    def bench_tk_lag(self):
+        # Lateness of a periodic after() callback while the poller and UI queue
+        # run as in the App
+        interval_ms = 50
+        lags = []
+        expected = [time.perf_counter() + interval_ms / 1000]
+        end = time.perf_counter() + self.options.lag_seconds
+
+        def heartbeat():
+            now = time.perf_counter()
+            lags.append(max(now - expected[0], 0))
+            expected[0] = now + interval_ms / 1000
+
+            if now < end:
+                self.root.after(interval_ms, heartbeat)
+            else:
+                self.root.quit()
+
+        self.tabview.set("Status")
+        self.ui_queue.start()
+        self.poller.start()
+        self.root.after(interval_ms, heartbeat)
+        self.root.mainloop()
+
+        self.results["tk_lag"] = summarize(lags)
+
+    def run(self):
+        if self.root is not None:
+            self.build_frames()
+        else:
+            self.subscribe_all()
+
+        self.bench_poll()
+        self.bench_history()
+        if self.root is not None:
+            self.bench_tk_lag()
+
+        self.executor.shutdown()
+
+        return self.results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, summary in results.items():
+        if name not in baseline:
+            continue
+
+        limit = baseline[name]["p50"] * (1 + tolerance)
+        if summary["p50"] > limit:
+            regressions.append(
+                f"{name}: p50 {summary['p50']} ms, baseline {baseline[name]['p50']} ms"
+            )
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the GUI against a mock API")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--cycles", type=int, default=50, help="poll cycles")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per history size")
+    parser.add_argument("--lag-seconds", type=float, default=10)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    options = parser.parse_args()
+
+    server = mock_api.start_server(
+        mock_api.build_parser().parse_args(
+            [
+                "--port",
+                "0",
+                "--latency",
+                str(options.latency),
+                "--failure-rate",
+                str(options.failure_rate),
+            ]
+        )
+    )
+    host, port = server.server_address[:2]
+
+    data_dir = tempfile.mkdtemp(prefix="camper_gui_bench_")
+    os.environ["API_BASE"] = f"http://{host}:{port}"
+    os.environ["API_STREAM"] = "false"
+    os.environ["STATE_STORE_PATH"] = os.path.join(data_dir, "states.db")
+    os.environ["MESSAGE_LOG_PATH"] = os.path.join(data_dir, "messages.db")
+
+    xvfb, has_display = start_display()
+    try:
+        if not has_display:
+            print("No display and no Xvfb, skipping widget benchmarks")
+
+        results = Bench(options, has_display).run()
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+        server.shutdown()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(f"{'benchmark':<26}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name, summary in results.items():
+        print(
+            f"{name:<26}{summary['n']:>6}{summary['p50']:>10}"
+            f"{summary['p95']:>10}{summary['max']:>10}"
+        )
+
+    if options.json:
+        with open(options.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            regressions = compare(results, json.load(f), options.tolerance)
+
+        for regression in regressions:
+            print(f"Regression {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+# Local stand-in for the camper API, for running the GUI without the camper.
+#
+#   python tools/mock_api.py --port 8000
+#   API_BASE=http://localhost:8000 python camper_gui
+#
+# Serves the sensor catalogue, current states, history, actions and the
+# server-sent event stream of state changes. Use --no-stream to test the
+# polling fallback, --latency, --failure-rate and --history-rows to test
+# slow, flaky or large responses.
+import argparse
+import json
+import math
+import queue
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# sensor name: ((entity name, unit, initial state, step per update), ...)
+SENSORS = {
+    "camper": (
+        ("household_state", "", "OFF", None),
+        ("pump_state", "", "OFF", None),
+        ("water_state", "%", 80, 0.2),
+        ("waste_state", "%", 20, 0.2),
+        ("mains_voltage", "mV", 0, None),
+        ("household_voltage", "mV", 12800, 20),
+        ("starter_voltage", "mV", 12600, 10),
+    ),
+    "SmartShunt": (
+        ("soc", "%", 85.0, 0.1),
+        ("remaining_mins", "min", 1200, 5),
+        ("consumed_ah", "Ah", -12.0, 0.1),
+    ),
+    "SmartSolar": (
+        ("solar_power", "W", 120, 15),
+        ("yield_today", "kWh", 0.4, 0.01),
+        ("charge_state", "", "BULK", None),
+    ),
+    "outside": (("temperature", "C", 14.0, 0.1), ("humidity", "%", 70.0, 0.5)),
+    "inside": (("temperature", "C", 19.0, 0.1), ("humidity", "%", 55.0, 0.5)),
+}
+HISTORY_STEP_S = 60
+
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class MockState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sensors = []
+        self.entities = {}
+        self.states = {}
+        self.listeners = []
+
+        entity_id = 1
+        for sensor_id, (sensor_name, entities) in enumerate(SENSORS.items(), 1):
+            sensor = {"id": sensor_id, "name": sensor_name, "entities": []}
+            for name, unit, initial, step in entities:
+                entity = {
+                    "id": entity_id,
+                    "name": name,
+                    "unit": unit,
+                    "sensor_id": sensor_id,
+                }
+                sensor["entities"].append(entity)
+                self.entities[entity_id] = (entity, initial, step)
+                self.states[entity_id] = {
+                    "entity_id": entity_id,
+                    "state": initial,
+                    "created": now_iso(),
+                }
+                entity_id += 1
+            self.sensors.append(sensor)
+
+    def sensor_states(self, sensor_id):
+        with self.lock:
+            return [
+                self.states[e["id"]] for e in self.sensors[sensor_id - 1]["entities"]
+            ]
+
+    def history(self, entity_id, limit, since):
+        _, initial, step = self.entities[entity_id]
+        end = time.time()
+        start = end - limit * HISTORY_STEP_S
+        if since is not None:
+            start = max(start, since)
+
+        rows = []
+        t = math.floor(start / HISTORY_STEP_S) * HISTORY_STEP_S + HISTORY_STEP_S
+        while t <= end:
+            if step is None:
+                state = initial
+            else:
+                state = round(initial + 50 * step * math.sin(t / 3600), 3)
+            created = datetime.fromtimestamp(t, timezone.utc).isoformat()
+            rows.append({"entity_id": entity_id, "state": state, "created": created})
+            t += HISTORY_STEP_S
+
+        # The current state, e.g. set by an action, is the newest record
+        with self.lock:
+            current = self.states[entity_id]
+        if (
+            since is None
+            or datetime.fromisoformat(current["created"]).timestamp() > since
+        ):
+            rows.append(current)
+
+        return rows[-limit:]
+
+    def set_state(self, entity_id, state):
+        with self.lock:
+            self.states[entity_id] = {
+                "entity_id": entity_id,
+                "state": state,
+                "created": now_iso(),
+            }
+            changed = [self.states[entity_id]]
+
+        self.publish(changed)
+
+        return changed[0]
+
+    def step(self):
+        changed = []
+        with self.lock:
+            for entity_id, (_, _, step) in self.entities.items():
+                if step is None or random.random() < 0.5:
+                    continue
+
+                state = self.states[entity_id]["state"]
+                state = round(state + random.uniform(-step, step), 3)
+                self.states[entity_id] = {
+                    "entity_id": entity_id,
+                    "state": state,
+                    "created": now_iso(),
+                }
+                changed.append(self.states[entity_id])
+
+        self.publish(changed)
+
+    def subscribe(self):
+        listener = queue.Queue()
+        with self.lock:
+            self.listeners.append(listener)
+
+        return listener
+
+    def unsubscribe(self, listener):
+        with self.lock:
+            self.listeners.remove(listener)
+
+    def publish(self, changed):
+        if not changed:
+            return
+
+        with self.lock:
+            for listener in self.listeners:
+                listener.put(changed)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes, without this every
+    # response waits for a delayed ACK
+    disable_nagle_algorithm = True
+    mock = None
+    options = None
+
+    def log_message(self, format, *args):
+        if self.options.verbose:
+            super().log_message(format, *args)
+
+    def _degrade(self):
+        # Simulated network latency and failures, True when the request failed
+        if self.options.latency:
+            time.sleep(self.options.latency * random.uniform(0.5, 1.5))
+
+        if random.random() < self.options.failure_rate:
+            self._send_json({"detail": "Simulated failure"}, 503)
+            return True
+
+        return False
+
+    def _send_json(self, body, status=200):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        if self._degrade():
+            return
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if url.path == "/sensors":
+            self._send_json(self.mock.sensors)
+        elif m := re.fullmatch(r"/sensors/(\d+)/states/?", url.path):
+            sensor_id = int(m[1])
+            if not 1 <= sensor_id <= len(self.mock.sensors):
+                self._send_json({"detail": "Not found"}, 404)
+            else:
+                self._send_json(self.mock.sensor_states(sensor_id))
+        elif m := re.fullmatch(r"/entities/(\d+)/states/?", url.path):
+            entity_id = int(m[1])
+            if entity_id not in self.mock.entities:
+                self._send_json({"detail": "Not found"}, 404)
+                return
+
+            limit = int(query.get("limit", ["10000"])[0])
+            if self.options.history_rows is not None:
+                limit = min(limit, self.options.history_rows)
+            since = query.get("since", [None])[0]
+            if since is not None:
+                since = datetime.fromisoformat(since)
+                if since.tzinfo is None:
+                    since = since.replace(tzinfo=timezone.utc)
+                since = since.timestamp()
+            self._send_json(self.mock.history(entity_id, limit, since))
+        elif url.path == "/states/stream" and not self.options.no_stream:
+            self._stream()
+        else:
+            self._send_json({"detail": "Not found"}, 404)
+
+    def do_POST(self):
+        m = re.fullmatch(r"/action/(\d+)", urlparse(self.path).path)
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self._degrade():
+            return
+
+        if m is None or int(m[1]) not in self.mock.entities:
+            self._send_json({"detail": "Not found"}, 404)
+        else:
+            self._send_json(self.mock.set_state(int(m[1]), body.get("state")))
+
+    def _stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        listener = self.mock.subscribe()
+        try:
+            while True:
+                try:
+                    changed = listener.get(timeout=self.options.keepalive)
+                    event = f"data: {json.dumps(changed)}\n\n".encode()
+                except queue.Empty:
+                    event = b": keep-alive\n\n"
+                # One chunk per event, as streaming web frameworks send them
+                self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.mock.unsubscribe(listener)
+
+
+def step_runner(mock, interval):
+    while True:
+        time.sleep(interval)
+        mock.step()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Local stand-in for the camper API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--interval", type=float, default=1.0, help="seconds between state changes"
+    )
+    parser.add_argument(
+        "--keepalive", type=float, default=10.0, help="seconds between keep-alives"
+    )
+    parser.add_argument(
+        "--no-stream", action="store_true", help="answer the stream with 404"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="mean response delay in seconds"
+    )
+    parser.add_argument(
+        "--failure-rate",
+        type=float,
+        default=0.0,
+        help="fraction of requests answered with 503",
+    )
+    parser.add_argument(
+        "--history-rows", type=int, default=None, help="cap on history rows returned"
+    )
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+
+    return parser
+
+
+def start_server(options):
+    # Serves on a background thread, port 0 picks a free port
+    mock = MockState()
+    Handler.mock = mock
+    Handler.options = options
+
+    threading.Thread(
+        target=step_runner, args=(mock, options.interval), daemon=True
+    ).start()
+
+    server = ThreadingHTTPServer((options.host, options.port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def main():
+    options = build_parser().parse_args()
+    server = start_server(options)
+
+    host, port = server.server_address[:2]
+    print(f"Mock API on http://{host}:{port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# Soak run: simulates long polling against tools/mock_api.py and checks that
+# the process RSS stays flat.
+#
+#   python tools/soak.py --hours 24
+#
+# Runs the poll schedule of the given number of hours as fast as the mock API
+# answers: every sensor at its poll_intervals_ms, History delta fetches of a
+# few entities every 5 minutes and store compaction and log rotation every
+# hour, all in simulated time. RSS is sampled every simulated 30 minutes and
+# the run fails when it grows more than --max-growth-mb after the warm-up, or
+# when the history cache holds more than its memory budget allows.
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import mock_api
+from tool_common import MessageCounter
+
+HISTORY_ENTITIES = ("solar_power", "soc", "temperature")
+
+
+def check_history_budget(history_cache):
+    # Message when the cache holds more rows or bytes than allowed, else None
+    with history_cache.lock:
+        longest = max(map(len, history_cache.history_by_entity.values()), default=0)
+        nbytes = history_cache._nbytes()
+
+    if longest > history_cache.max_memory_rows:
+        return f"{longest} rows cached, the cap is {history_cache.max_memory_rows}"
+    if nbytes > history_cache.max_bytes:
+        return f"{nbytes} bytes cached, the budget is {history_cache.max_bytes}"
+
+    return None
+
+
+def soak(options):
+    # Imported after the environment is set up, settings are read on import
+    from api_client import ApiClient
+    from config import settings
+    from fetch_engine import FetchEngine
+    from history_cache import HistoryCache
+    from instrumentation import rss_bytes
+    from message_log import MessageLog
+    from state_poller import StatePoller
+    from state_store import StateStore
+    from ui_queue import UiQueue
+
+    ui_queue = UiQueue(None)
+    statusbar = MessageCounter()
+    api_client = ApiClient()
+    state_store = StateStore()
+    message_log = MessageLog()
+    executor = FetchEngine()
+    api_sensors = api_client.get_sensors()
+
+    poller = StatePoller(
+        None, statusbar, ui_queue, api_client, state_store, api_sensors, executor
+    )
+    for sensor in api_sensors:
+        poller.subscribe(
+            lambda states: None,
+            sensor["name"],
+            [e["name"] for e in sensor["entities"]],
+        )
+
+    history_cache = HistoryCache(api_client, state_store)
+    print(
+        f"History cache: {history_cache.max_memory_rows} rows per entity, "
+        f"{history_cache.max_bytes / 2**20:g} MB in total"
+    )
+    history_entity_ids = [
+        e["id"]
+        for sensor in api_sensors
+        for e in sensor["entities"]
+        if e["name"] in HISTORY_ENTITIES
+    ]
+
+    interval_s_by_sensor = {
+        sensor["name"]: max(
+            settings.poll_intervals_ms.get(sensor["name"], settings.poll_interval_ms)
+            // 1000,
+            1,
+        )
+        for sensor in api_sensors
+    }
+
+    samples = []
+    over_budget = None
+    total_s = int(options.hours * 3600)
+    started = time.perf_counter()
+
+    for t in range(0, total_s):
+        due = [
+            sensor_name
+            for sensor_name, interval_s in interval_s_by_sensor.items()
+            if t % interval_s == 0
+        ]
+        if due:
+            poller.poll(due)
+            ui_queue.drain()
+
+        if t % 300 == 0:
+            for entity_id in history_entity_ids:
+                try:
+                    history_cache.get_states(entity_id)
+                except Exception as ex:
+                    statusbar.add_message(str(ex))
+
+            over_budget = check_history_budget(history_cache)
+            if over_budget:
+                break
+
+        if t % 3600 == 0:
+            state_store.compact()
+            message_log.rotate()
+
+        if t % 1800 == 0:
+            samples.append((t / 3600, rss_bytes() / 2**20))
+            print(
+                f"{t / 3600:6.1f} h simulated  RSS {samples[-1][1]:7.1f} MB"
+                f"  ({time.perf_counter() - started:.0f} s)",
+                flush=True,
+            )
+
+    executor.shutdown()
+
+    return samples, statusbar.count, over_budget
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check RSS stays flat over time")
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument(
+        "--warmup", type=float, default=0.1, help="fraction of the run ignored"
+    )
+    parser.add_argument("--max-growth-mb", type=float, default=5)
+    parser.add_argument("--low-memory", action="store_true")
+    parser.add_argument(
+        "--history-budget-mb",
+        type=float,
+        default=5,
+        help="history memory budget, the default is the Pi one",
+    )
+    options = parser.parse_args()
+
+    server = mock_api.start_server(
+        mock_api.build_parser().parse_args(["--port", "0", "--interval", "0.1"])
+    )
+    host, port = server.server_address[:2]
+
+    data_dir = tempfile.mkdtemp(prefix="camper_gui_soak_")
+    os.environ["API_BASE"] = f"http://{host}:{port}"
+    os.environ["STATE_STORE_PATH"] = os.path.join(data_dir, "states.db")
+    os.environ["MESSAGE_LOG_PATH"] = os.path.join(data_dir, "messages.db")
+    os.environ["HISTORY_MEMORY_BUDGET_MB"] = str(options.history_budget_mb)
+    if options.low_memory:
+        os.environ["LOW_MEMORY"] = "true"
+
+    try:
+        samples, errors, over_budget = soak(options)
+    finally:
+        server.shutdown()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    if over_budget:
+        print(f"History cache over budget: {over_budget}")
+        sys.exit(1)
+
+    # Runs shorter than one sample interval after the warm-up use all samples
+    after_warmup = [
+        rss for hours, rss in samples if hours >= options.hours * options.warmup
+    ] or [rss for _, rss in samples]
+    growth = max(after_warmup) - after_warmup[0]
+    print(f"RSS growth after warm-up: {growth:.1f} MB, {errors} errors")
+
+    if growth > options.max_growth_mb:
+        print(f"RSS grew more than {options.max_growth_mb} MB")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+# Shared by the tool scripts: makes the camper_gui modules importable and
+# stands in for the status bar on runs without a display.
+import os
+import sys
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TOOLS_DIR), "camper_gui"))
+
+
+class MessageCounter:
+    # Status bar without a display
+    def __init__(self):
+        self.count = 0
+
+    def add_message(self, message, state="error", details=None):
+        self.count += 1